@@ -1,48 +1,180 @@
 # for flask server
 
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify, Response, stream_with_context, g
+from werkzeug.exceptions import RequestEntityTooLarge
+from io import BytesIO
 from flask_cors import CORS
-from solver import solve
-from read_image import parser
+from solver import solve, ENGINES, SearchBudget, SearchAborted
 import os
-from solver import generate_board
+import atexit
+import json
+import math
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from solver import generate_board, generate_puzzle, solve_batch, validate_grid, InvalidGrid, DIFFICULTIES, SIZE_DIFFICULTIES, BOARD_SIZES
+from puzzle_pool import PuzzlePool
+from result_cache import ResultCache, bytes_key, get_or_solve_canonical
+from hint_sessions import HintSessions
+from metrics import SolverMetrics
+from profiler import SamplingProfiler
+
+# request class that keeps uploaded files in memory instead of spooling large ones to a temporary file on disk
+# note: safe because MAX_CONTENT_LENGTH bounds the size of every request
+class InMemoryUploadRequest(Request):
+        def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+                return BytesIO()
 
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
+
+# largest request body accepted, mostly to bound image uploads (default 10 MB)
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+
+# pre-generated puzzle pool for /generate, sizes configurable through the environment
+app.config['PUZZLE_POOL_LOW_WATERMARK'] = int(os.environ.get('PUZZLE_POOL_LOW_WATERMARK', 5))
+app.config['PUZZLE_POOL_HIGH_WATERMARK'] = int(os.environ.get('PUZZLE_POOL_HIGH_WATERMARK', 20))
+app.config['PUZZLE_POOL_WORKERS'] = int(os.environ.get('PUZZLE_POOL_WORKERS', 1))
+
+puzzle_pool = PuzzlePool(
+        low_watermark=app.config['PUZZLE_POOL_LOW_WATERMARK'],
+        high_watermark=app.config['PUZZLE_POOL_HIGH_WATERMARK'],
+        workers=app.config['PUZZLE_POOL_WORKERS'],
+)
+# the pool starts on the first /generate rather than here, so importing the app (asgi_app.py, the debug reloader's parent
+# process, scripts and benchmarks) doesn't start worker processes and a refill thread; it's stopped when the process exits
+atexit.register(puzzle_pool.stop)
+
+# content-addressed caches of /solve and /image results, so repeated puzzles and re-uploaded photos skip the work
+# with RESULT_CACHE_PATH set, results are also kept in that SQLite file and shared between worker processes
+app.config['RESULT_CACHE_SIZE'] = int(os.environ.get('RESULT_CACHE_SIZE', 10000))
+app.config['RESULT_CACHE_TTL'] = float(os.environ.get('RESULT_CACHE_TTL', 3600))
+app.config['RESULT_CACHE_PATH'] = os.environ.get('RESULT_CACHE_PATH')
+
+solve_cache = ResultCache(app.config['RESULT_CACHE_SIZE'], app.config['RESULT_CACHE_TTL'], app.config['RESULT_CACHE_PATH'], name='solve')
+image_cache = ResultCache(app.config['RESULT_CACHE_SIZE'], app.config['RESULT_CACHE_TTL'], app.config['RESULT_CACHE_PATH'], name='image')
+
+# search budget of a single /solve request: seconds, and optionally nodes, before the solver gives up on a puzzle
+app.config['SOLVE_TIME_LIMIT'] = float(os.environ.get('SOLVE_TIME_LIMIT', 10))
+app.config['SOLVE_MAX_NODES'] = int(os.environ['SOLVE_MAX_NODES']) if os.environ.get('SOLVE_MAX_NODES') else None
+
+# hint sessions: how many are kept, and for how many seconds after their last hint
+app.config['HINT_SESSIONS'] = int(os.environ.get('HINT_SESSIONS', 1000))
+app.config['HINT_SESSION_TTL'] = float(os.environ.get('HINT_SESSION_TTL', 1800))
 
-# make temporary relative uploads folder
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True) # create the folder
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+hint_sessions = HintSessions(app.config['HINT_SESSIONS'], app.config['HINT_SESSION_TTL'], app.config['SOLVE_TIME_LIMIT'])
+
+# solver statistics summed over every /solve request, exported at /metrics
+solver_metrics = SolverMetrics()
+
+# with PROFILE_DIR set, every request is profiled with a sampling profiler and its samples written to that directory
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')
+app.config['PROFILE_INTERVAL'] = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+# create the directory up front, otherwise writing the samples would fail at the end of every request
+if app.config['PROFILE_DIR']:
+        os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
 
 CORS(app)
 
-# solve route, used by solve and hint buttons on frontend
+# start profiling the request on the thread that handles it
+@app.before_request
+def start_profiler():
+        if app.config['PROFILE_DIR']:
+                g.profiler = SamplingProfiler(interval=app.config['PROFILE_INTERVAL'])
+                g.profiler.start()
+
+# write the request's samples as <time in ms>-<endpoint>-<thread>.folded, ready for a flamegraph tool
+@app.teardown_request
+def stop_profiler(exception=None):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+                profiler.stop()
+                filename = f"{int(time.time() * 1000)}-{request.endpoint or 'unknown'}-{threading.get_ident()}.folded"
+                profiler.write(os.path.join(app.config['PROFILE_DIR'], filename))
+
+# solve route, used by the solve button on frontend
+# with "stats": true in the body, the grid is solved even if its result is cached, and the response includes the
+# search statistics of that solve (see solver.SEARCH_COUNTERS, plus the deductions of each propagation rule)
 @app.route('/solve', methods=['POST'])
 def solve_sudoku():
         try:
-                data = request.get_json()
+                data = request.get_json(silent=True)
+                if not isinstance(data, dict):
+                        return jsonify({'message': 'Expected a JSON body'}), 400
                 grid = data.get('grid')
 
-                # add empty cells to to_assign, used in solve() function
-                to_assign = {(r, c): [] for r in range(9) for c in range(9) if grid[r][c] == -1}
+                # optional solver engine, defaults to the csp backtracker
+                engine = data.get('engine', 'csp')
+                if engine not in ENGINES:
+                        return jsonify({'message': 'Unknown engine: ' + str(engine)}), 400
+
+                # reject malformed grids, and grids that a quick look shows can't be solved, before the cache or the search
+                started = time.perf_counter()
+                validate_grid(grid)
+
+                # solve on a cache miss, keyed by the engine and the grid, or for grids that take more than a few nodes, the grid's
+                # canonical form, so isomorphic grids share one solve (see result_cache.get_or_solve_canonical)
+                # note: the cached value is a dict so "no solution" is cached too
+                counters = {}
+                computed = False
+                def compute(target, max_nodes=None):
+                        nonlocal computed
+                        # add empty cells to to_assign, used in solve() function
+                        to_assign = {(r, c): [] for r in range(len(target)) for c in range(len(target)) if target[r][c] == -1}
+                        limit = app.config['SOLVE_MAX_NODES']
+                        if max_nodes is not None:
+                                limit = max_nodes if limit is None else min(limit, max_nodes)
+                        # the quick attempt and the solve of the canonical form share one SOLVE_TIME_LIMIT
+                        budget = SearchBudget(app.config['SOLVE_TIME_LIMIT'] - (time.perf_counter() - started), limit)
+                        solution, is_unique = solve(target, to_assign, engine=engine, counters=counters, budget=budget)
+                        computed = True
+                        return {"solution": solution, "is_unique": is_unique}
 
                 # get solution
-                solution, is_unique = solve(grid, to_assign)
+                if data.get('stats'):
+                        result = compute(grid)
+                else:
+                        result = get_or_solve_canonical(solve_cache, grid, compute, prefix=engine + ':')
+                solution, is_unique = result["solution"], result["is_unique"]
+
+                outcome = 'cached' if not computed else 'none' if solution is None else 'unique' if is_unique else 'multiple'
+                solver_metrics.record(engine, outcome, time.perf_counter() - started, counters)
+                stats = {"stats": counters} if data.get('stats') else {}
 
                 # if no solution found, return null response
                 if solution is None:
                         return jsonify({
                                 "message": "No solution found",
                                 "solution": None,
-                                "is_unique": False
+                                "is_unique": False,
+                                **stats
                         }), 200
 
                 # return the solution and uniqueness
                 return jsonify({
                         "message": "Solution found",
                         "solution": solution,
-                        "is_unique": is_unique
+                        "is_unique": is_unique,
+                        **stats
                         }), 200
+
+        # case: the grid is malformed or can't be solved, with the reason and the cells at fault
+        except InvalidGrid as e:
+                solver_metrics.record(engine, 'invalid', time.perf_counter() - started)
+                return jsonify({
+                        "message": "Invalid grid",
+                        "error": str(e),
+                        "reason": e.reason,
+                        "cells": e.cells
+                }), 400
+
+        # case: the search ran out of time or nodes
+        except SearchAborted as e:
+                solver_metrics.record(engine, 'aborted', time.perf_counter() - started, counters)
+                return jsonify({
+                        "message": "Search budget exceeded",
+                        "error": str(e)
+                }), 422
         
         # return server error
         except Exception as e:
@@ -52,11 +184,143 @@ def solve_sudoku():
                         "error": str(e)
                 }), 500
         
+# hint route, used by the hint button on frontend
+# takes {"grid": [...], "token": ...} and returns the cheapest next deduction, {"hint": {"row", "col", "value", "technique"}, "token": ...},
+# where technique is one of solver.HINT_TECHNIQUES. sending back the token with the next grid lets the server continue from
+# the candidates it already worked out, as long as the grid only has more cells filled in
+@app.route('/hint', methods=['POST'])
+def hint():
+        try:
+                data = request.get_json(silent=True)
+                if not isinstance(data, dict):
+                        return jsonify({'message': 'Expected a JSON body'}), 400
+                grid = data.get('grid')
+                validate_grid(grid)
+                token = data.get('token') if isinstance(data.get('token'), str) else None
+
+                # case: nothing left to hint
+                if all(elem != -1 for row in grid for elem in row):
+                        return jsonify({
+                                "message": "Puzzle is already complete",
+                                "hint": None,
+                                "token": token
+                        }), 200
+
+                found, token = hint_sessions.hint(grid, token)
+
+                # case: the grid contradicts itself somewhere
+                if found is None:
+                        return jsonify({
+                                "message": "No solution found",
+                                "hint": None,
+                                "token": token
+                        }), 200
+
+                cell, value, technique = found
+                return jsonify({
+                        "message": "Hint found",
+                        "hint": {"row": cell // len(grid), "col": cell % len(grid), "value": value, "technique": technique},
+                        "token": token
+                }), 200
+
+        # case: the grid is malformed or can't be solved
+        except InvalidGrid as e:
+                return jsonify({
+                        "message": "Invalid grid",
+                        "error": str(e),
+                        "reason": e.reason,
+                        "cells": e.cells
+                }), 400
+
+        # case: the puzzle needed a search, which ran out of time or nodes
+        except SearchAborted as e:
+                return jsonify({
+                        "message": "Search budget exceeded",
+                        "error": str(e)
+                }), 422
+
+        # return server error
+        except Exception as e:
+                print("Error in /hint route:", str(e))
+                return jsonify({
+                        "message": "Internal server error",
+                        "error": str(e)
+                }), 500
+
+# process pool shared by /solve/batch requests, created on first use and sized to the number of cores
+batch_executor = None
+
+def get_batch_executor():
+        global batch_executor
+        if batch_executor is None:
+                batch_executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+        return batch_executor
+
+# batch solve route, takes {"grids": [...], "engine": ...} and streams one JSON line per grid, in input order:
+# {"index": i, "status": "unique" | "multiple" | "none" | "invalid" | "aborted", "solution": [...] or null}
+# each grid is searched within SOLVE_TIME_LIMIT and SOLVE_MAX_NODES, and reported as aborted if it runs out
+@app.route('/solve/batch', methods=['POST'])
+def solve_sudoku_batch():
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('grids'), list):
+                return jsonify({'message': 'Expected a JSON body with a "grids" list'}), 400
+
+        engine = data.get('engine', 'csp')
+        if engine not in ENGINES:
+                return jsonify({'message': 'Unknown engine: ' + str(engine)}), 400
+
+        grids = data['grids']
+
+        # stream results back as they're solved, so the client can start reading before the whole batch is done
+        def generate_lines():
+                results = solve_batch(grids, engine, get_batch_executor(), time_limit=app.config['SOLVE_TIME_LIMIT'], max_nodes=app.config['SOLVE_MAX_NODES'])
+                for index, result in enumerate(results):
+                        yield json.dumps({"index": index, **result}) + "\n"
+
+        return Response(stream_with_context(generate_lines()), mimetype='application/x-ndjson')
+
+# largest board size /generate takes a difficulty for
+MAX_DIFFICULTY_SIZE = 16
+
 # generate route, generates puzzle board
 @app.route('/generate', methods=['GET'])
 def generate():
         try:
-                board = generate_board()
+                # optional solver engine, defaults to the csp backtracker
+                engine = request.args.get('engine', 'csp')
+                if engine not in ENGINES:
+                        return jsonify({'message': 'Unknown engine: ' + engine}), 400
+
+                # optional target difficulty, otherwise any ready puzzle
+                difficulty = request.args.get('difficulty')
+                if difficulty is not None and difficulty not in DIFFICULTIES:
+                        return jsonify({'message': 'Unknown difficulty: ' + difficulty}), 400
+
+                # optional board size (4, 9, 16, or 25 cells on a side), defaults to 9
+                size = request.args.get('size', '9')
+                if not size.isdigit() or int(size) not in BOARD_SIZES:
+                        return jsonify({'message': 'Unknown board size: ' + size}), 400
+                size = int(size)
+
+                # the pool is filled by the csp engine with 9 x 9 puzzles, so other engines and sizes generate on the request thread
+                if difficulty is not None and engine != 'csp':
+                        return jsonify({'message': 'The difficulty parameter is only supported by the csp engine'}), 400
+                # rating a 25 x 25 puzzle takes far longer than a request can wait, so difficulty stops at 16 x 16
+                if difficulty is not None and size > MAX_DIFFICULTY_SIZE:
+                        return jsonify({'message': 'The difficulty parameter is only supported up to ' + str(MAX_DIFFICULTY_SIZE) + ' x ' + str(MAX_DIFFICULTY_SIZE)}), 400
+                # small boards can't reach the harder levels at all, so they'd spend the whole time limit trying
+                if difficulty is not None and difficulty not in SIZE_DIFFICULTIES.get(size, DIFFICULTIES):
+                        return jsonify({'message': 'A ' + str(size) + ' x ' + str(size) + ' board can only be generated at difficulty ' + ', '.join(SIZE_DIFFICULTIES[size])}), 400
+                if engine == 'csp' and size == 9:
+                        puzzle_pool.start()
+                        board = puzzle_pool.get(difficulty)
+                elif difficulty is not None:
+                        board, _ = generate_puzzle(difficulty, app.config['SOLVE_TIME_LIMIT'], box=math.isqrt(size))
+                        # case: not even a full board was filled in time
+                        if board is None:
+                                return jsonify({'message': 'No puzzle generated within the time limit'}), 503
+                else:
+                        board = generate_board(engine, math.isqrt(size))
                 return jsonify({
                         "message": "Board generated",
                         "board": board,
@@ -69,6 +333,35 @@ def generate():
                         "error": str(e)
                 }), 500
 
+# puzzle pool metrics: ready puzzles per bucket, hits/misses, and refill rate
+@app.route('/generate/pool', methods=['GET'])
+def generate_pool_metrics():
+        return jsonify(puzzle_pool.metrics())
+
+# prometheus metrics: solver statistics summed over every /solve request, and the sizes and hit counts of the caches and the puzzle pool
+@app.route('/metrics', methods=['GET'])
+def metrics():
+        caches = {"solve": solve_cache.stats(), "image": image_cache.stats()}
+        pool = puzzle_pool.metrics()
+        extra = [
+                ('sudoku_cache_hits_total', 'counter', 'Result cache hits, in memory or from the shared file.', {f'cache="{name}"': stats['hits'] + stats['shared_hits'] for name, stats in caches.items()}),
+                ('sudoku_cache_misses_total', 'counter', 'Result cache misses.', {f'cache="{name}"': stats['misses'] for name, stats in caches.items()}),
+                ('sudoku_cache_entries', 'gauge', 'Entries in each result cache.', {f'cache="{name}"': stats['entries'] for name, stats in caches.items()}),
+                ('sudoku_puzzle_pool_size', 'gauge', 'Ready puzzles per difficulty bucket.', {f'bucket="{name}"': size for name, size in pool['sizes'].items()}),
+                ('sudoku_puzzle_pool_hits_total', 'counter', 'Puzzles served from the pool.', {'': pool['hits']}),
+                ('sudoku_puzzle_pool_misses_total', 'counter', 'Puzzles generated on the request thread because the pool was empty.', {'': pool['misses']}),
+        ]
+        return Response(solver_metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+# result cache metrics: entries, hits (in memory and from the shared file), misses, and evictions of each cache, and of the hint sessions
+@app.route('/cache', methods=['GET'])
+def cache_metrics():
+        return jsonify({
+                "solve": solve_cache.stats(),
+                "image": image_cache.stats(),
+                "hints": hint_sessions.stats(),
+        })
+
 # image route, used by upload image button on frontend
 @app.route('/image', methods=['POST'])
 def parse_image():
@@ -82,12 +375,22 @@ def parse_image():
                 if file.filename == '':
                         return jsonify({'message': 'No selected file'}), 400
                 
-                # create relative file path to upload folder
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename) # uploads/filename
-                file.save(file_path)
-
-                # parse the image
-                grid = parser(file_path)
+                # parse the image straight from the uploaded bytes rather than saving them to disk and reading them back
+                # note: imported here so the OCR stack (opencv, and the model on first use) is only loaded by processes that parse images
+                # the parsed grid is cached by the hash of the uploaded bytes, so re-uploading the same photo skips the OCR
+                from read_image import parse_image_bytes, UndecodableImage
+                stream = file.stream
+                try:
+                        if isinstance(stream, BytesIO):
+                                # view the buffer in place, releasing the view before werkzeug closes the stream
+                                with stream.getbuffer() as data:
+                                        grid = image_cache.get_or_compute(bytes_key(data), lambda: parse_image_bytes(data))
+                        else:
+                                data = stream.read()
+                                grid = image_cache.get_or_compute(bytes_key(data), lambda: parse_image_bytes(data))
+                # case: the upload isn't an image opencv can decode (see read_image.decode_image)
+                except UndecodableImage as e:
+                        return jsonify({'message': str(e)}), 400
 
                 # detect if client has disconnected, return with AbortError
                 socket_obj = request.environ.get('werkzeug.socket')
@@ -100,6 +403,12 @@ def parse_image():
                         "grid": grid
                 })
         
+        # case: upload larger than MAX_CONTENT_LENGTH
+        except RequestEntityTooLarge:
+                return jsonify({
+                        "message": "Image too large, the limit is " + str(app.config['MAX_CONTENT_LENGTH']) + " bytes"
+                }), 413
+
         # return server error
         except Exception as e:
                 print("Error in /image route:", str(e))
@@ -108,6 +417,5 @@ def parse_image():
                         "error": str(e)
                 }), 500
 
-
 if __name__ == '__main__':
     app.run(port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,240 @@
+# async (ASGI) serving mode, an alternative to `flask run` for production:
+#   uvicorn asgi_app:app --port 5000
+#
+# /solve and /image run in a bounded process pool (see offload.py) instead of on a server thread, so a slow puzzle or image
+# can't pin the server: searches stop once they run out of their SOLVE_TIME_LIMIT / SOLVE_MAX_NODES budget (422), work is
+# cancelled when the client disconnects, and once ASYNC_QUEUE_LIMIT requests are queued or running, new ones get a 429.
+# every other route is served by the flask app in app.py.
+import json
+import os
+import time
+from io import BytesIO
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.formparser import parse_form_data
+
+from app import app as flask_app, solve_cache, image_cache, solver_metrics, puzzle_pool
+from offload import OffloadPool, QueueFull, ClientDisconnected, solve_task, quick_solve_task, parse_image_task
+from result_cache import grid_key, bytes_key, CANONICAL_AFTER_NODES
+from solver import ENGINES, invert_transform, validate_grid, InvalidGrid
+
+# worker processes, and requests that can be queued or running at once
+ASYNC_WORKERS = int(os.environ.get('ASYNC_WORKERS', os.cpu_count()))
+ASYNC_QUEUE_LIMIT = int(os.environ.get('ASYNC_QUEUE_LIMIT', ASYNC_WORKERS * 4))
+
+# seconds a client is told to wait before retrying a request that was turned away
+RETRY_AFTER = 1
+
+offload_pool = OffloadPool(ASYNC_WORKERS, ASYNC_QUEUE_LIMIT)
+wsgi_app = WsgiToAsgi(flask_app)
+
+# raised by read_body when the request is larger than MAX_CONTENT_LENGTH
+class BodyTooLarge(Exception):
+    pass
+
+# read the whole request body, up to limit bytes
+async def read_body(receive, limit: int = None):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected()
+        body += message.get('body', b'')
+        if limit is not None and len(body) > limit:
+            raise BodyTooLarge()
+        if not message.get('more_body', False):
+            return bytes(body)
+
+# send a JSON response, with the same CORS header flask_cors adds to the flask routes
+async def send_json(send, status: int, payload, headers: list = ()):
+    body = json.dumps(payload).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+# run a request handler, turning the errors shared by every offloaded route into responses
+async def handle(handler, scope, receive, send):
+    try:
+        await handler(scope, receive, send)
+
+    # case: client went away -> nobody to answer
+    except ClientDisconnected:
+        pass
+
+    # case: every slot is taken -> ask the client to come back later
+    except QueueFull:
+        await send_json(send, 429, {"message": "Server busy, try again later"}, [(b'retry-after', str(RETRY_AFTER).encode())])
+
+    # case: request larger than MAX_CONTENT_LENGTH
+    except BodyTooLarge:
+        await send_json(send, 413, {"message": "Request too large, the limit is " + str(flask_app.config['MAX_CONTENT_LENGTH']) + " bytes"})
+
+    # return server error
+    except Exception as e:
+        print("Error in " + scope['path'] + " route:", str(e))
+        await send_json(send, 500, {"message": "Internal server error", "error": str(e)})
+
+# solve route, same request and response as the flask /solve
+async def solve_sudoku(scope, receive, send):
+    try:
+        data = json.loads(await read_body(receive, flask_app.config['MAX_CONTENT_LENGTH']))
+    except ValueError:
+        return await send_json(send, 400, {"message": "Expected a JSON body"})
+    if not isinstance(data, dict):
+        return await send_json(send, 400, {"message": "Expected a JSON body"})
+    grid = data.get('grid')
+
+    # optional solver engine, defaults to the csp backtracker
+    engine = data.get('engine', 'csp')
+    if engine not in ENGINES:
+        return await send_json(send, 400, {"message": "Unknown engine: " + str(engine)})
+
+    # look the grid up in the cache, and only solve on a miss (see solve_cached)
+    # with "stats", the grid itself is solved whether or not it's cached, so the statistics describe this request
+    started = time.perf_counter()
+    # reject malformed and plainly unsolvable grids here, before the cache or a worker (see solver.validate_grid)
+    try:
+        validate_grid(grid)
+    except InvalidGrid as e:
+        solver_metrics.record(engine, 'invalid', time.perf_counter() - started)
+        return await send_json(send, 400, {"message": "Invalid grid", "error": str(e), "reason": e.reason, "cells": e.cells})
+    if data.get('stats'):
+        result = await offload_pool.run(receive, solve_task, grid, engine, flask_app.config['SOLVE_TIME_LIMIT'], flask_app.config['SOLVE_MAX_NODES'], cancellable=True)
+        cached = False
+    else:
+        result, cached = await solve_cached(receive, grid, engine)
+
+    # case: the search ran out of time or nodes
+    if 'aborted' in result:
+        solver_metrics.record(engine, 'aborted', time.perf_counter() - started, result['stats'])
+        return await send_json(send, 422, {"message": "Search budget exceeded", "error": result['aborted']})
+
+    if cached:
+        solver_metrics.record(engine, 'cached', time.perf_counter() - started)
+    else:
+        outcome = 'none' if result['solution'] is None else 'unique' if result['is_unique'] else 'multiple'
+        solver_metrics.record(engine, outcome, time.perf_counter() - started, result['stats'])
+    stats = {"stats": result['stats']} if data.get('stats') else {}
+
+    # if no solution found, return null response
+    if result['solution'] is None:
+        return await send_json(send, 200, {"message": "No solution found", "solution": None, "is_unique": False, **stats})
+
+    # return the solution and uniqueness
+    return await send_json(send, 200, {"message": "Solution found", "solution": result['solution'], "is_unique": result['is_unique'], **stats})
+
+# the async counterpart of result_cache.get_or_solve_canonical: look the grid up by its own key, solve a miss in the offload
+# pool within CANONICAL_AFTER_NODES nodes, and only canonicalize the grids that outlast that (in the same task, see
+# offload.quick_solve_task), so isomorphs of hard puzzles that were already solved still hit. both solves share one
+# SOLVE_TIME_LIMIT. returns (result, cached): solve_task's result, with the solution in the grid's own coordinates, or the
+# cached result
+async def solve_cached(receive, grid: list, engine: str):
+    started = time.perf_counter()
+    time_limit, max_nodes = flask_app.config['SOLVE_TIME_LIMIT'], flask_app.config['SOLVE_MAX_NODES']
+    key = engine + ':' + grid_key(grid)
+    result = solve_cache.get(key)
+    if result is not None:
+        return result, True
+
+    quick_nodes = CANONICAL_AFTER_NODES if max_nodes is None else min(max_nodes, CANONICAL_AFTER_NODES)
+    result = await offload_pool.run(receive, quick_solve_task, grid, engine, time_limit, quick_nodes, cancellable=True)
+    if 'aborted' in result:
+        return result, False
+    cached = False
+    if 'canonical' in result:
+        canonical, transform = result['canonical'], result['transform']
+        canonical_key = engine + ':' + grid_key(canonical)
+        # the canonical key is only worth a lookup if other grids can share it (it's the grid's own key on other sizes than 9 x 9)
+        result = solve_cache.get(canonical_key) if canonical_key != key else None
+        cached = result is not None
+        if result is None:
+            time_left = time_limit - (time.perf_counter() - started)
+            if time_left <= 0:
+                return {"aborted": "time budget exceeded", "stats": {}}, False
+            result = await offload_pool.run(receive, solve_task, canonical, engine, time_left, max_nodes, cancellable=True)
+            if 'aborted' in result:
+                return result, False
+            if canonical_key != key:
+                solve_cache.put(canonical_key, {"solution": result['solution'], "is_unique": result['is_unique']})
+        if result['solution'] is not None:
+            result = {**result, "solution": invert_transform(result['solution'], transform)}
+
+    solve_cache.put(key, {"solution": result['solution'], "is_unique": result['is_unique']})
+    return result, cached
+
+# image route, same request and response as the flask /image
+async def parse_image(scope, receive, send):
+    body = await read_body(receive, flask_app.config['MAX_CONTENT_LENGTH'])
+
+    # parse the multipart form with werkzeug, keeping uploaded files in memory
+    headers = dict(scope['headers'])
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'CONTENT_TYPE': headers.get(b'content-type', b'').decode('latin-1'),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body),
+    }
+    _, _, files = parse_form_data(environ, stream_factory=lambda *args, **kwargs: BytesIO())
+
+    # case: no image provided
+    if 'image' not in files:
+        return await send_json(send, 400, {"message": "No file part received"})
+
+    file = files['image']
+    if file.filename == '':
+        return await send_json(send, 400, {"message": "No selected file"})
+
+    # parse the image in the pool unless the same bytes were parsed before
+    data = file.stream.getvalue()
+    key = bytes_key(data)
+    grid = image_cache.get(key)
+    if grid is None:
+        result = await offload_pool.run(receive, parse_image_task, data)
+        # case: the upload isn't an image opencv can decode (see read_image.decode_image)
+        if 'undecodable' in result:
+            return await send_json(send, 400, {"message": result['undecodable']})
+        grid = result['grid']
+        image_cache.put(key, grid)
+
+    # return the grid parsed from the image
+    return await send_json(send, 200, {"message": "received image: " + file.filename, "grid": grid})
+
+# offload pool metrics: busy slots, and submitted, rejected, and cancelled requests
+async def offload_metrics(scope, receive, send):
+    return await send_json(send, 200, offload_pool.stats())
+
+ROUTES = {
+    ('POST', '/solve'): solve_sudoku,
+    ('POST', '/image'): parse_image,
+    ('GET', '/offload'): offload_metrics,
+}
+
+# start the worker processes with the server, and stop them with it
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            offload_pool.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            offload_pool.shutdown()
+            puzzle_pool.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    handler = ROUTES.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+    if handler is not None:
+        return await handle(handler, scope, receive, send)
+    return await wsgi_app(scope, receive, send)
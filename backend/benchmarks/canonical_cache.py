@@ -0,0 +1,82 @@
+# hit rate of the canonical-form solve cache against a plain content-hash cache
+# a corpus of generated puzzles is solved once, then a stream of requests is replayed against both caches, where each
+# request is a random isomorph of a corpus puzzle (relabeled, transposed, rows/columns/bands/stacks shuffled) or,
+# with --exact-share, the corpus puzzle itself. it also reports how many generated puzzles were already isomorphic to each other.
+# generated puzzles mostly take fewer search nodes than canonicalizing is worth (see result_cache.CANONICAL_AFTER_NODES), so
+# their isomorphs are solved rather than matched; --hard replays the puzzles in hard_puzzles.txt instead, which do get matched
+# usage (from backend/): python -m benchmarks.canonical_cache [--corpus N] [--requests N] [--exact-share F] [--hard] [--seed S]
+import argparse
+import random
+import time
+
+import solver
+from benchmarks.fixtures import hard_puzzles
+from result_cache import ResultCache, grid_key, get_or_solve_canonical
+
+# a random member of the grid's symmetry class
+def random_isomorph(grid: list):
+    if random.random() < 0.5:
+        grid = solver.transpose(grid)
+    row_order = [band * 3 + row for band in random.sample(range(3), 3) for row in random.sample(range(3), 3)]
+    col_order = [stack * 3 + col for stack in random.sample(range(3), 3) for col in random.sample(range(3), 3)]
+    relabel = [0] + random.sample(range(1, 10), 9)
+    return [[-1 if grid[r][c] == -1 else relabel[grid[r][c]] for c in col_order] for r in row_order]
+
+def solve_result(grid: list, max_nodes: int = None):
+    to_assign = {(r, c): [] for r in range(9) for c in range(9) if grid[r][c] == -1}
+    solution, is_unique = solver.solve(grid, to_assign, budget=solver.SearchBudget(max_nodes=max_nodes))
+    return {"solution": solution, "is_unique": is_unique}
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='hit rate of the canonical solve cache')
+    arg_parser.add_argument('--corpus', type=int, default=200, help='number of generated puzzles')
+    arg_parser.add_argument('--requests', type=int, default=2000, help='number of solve requests replayed')
+    arg_parser.add_argument('--exact-share', type=float, default=0.0, help='fraction of requests that repeat a corpus puzzle exactly')
+    arg_parser.add_argument('--hard', action='store_true', help='use the puzzles in hard_puzzles.txt as the corpus')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+    random.seed(args.seed)
+
+    corpus = [board for _, board in hard_puzzles()] if args.hard else [solver.generate_board() for _ in range(args.corpus)]
+
+    # isomorphic pairs within the generated corpus itself
+    started = time.perf_counter()
+    canonical_keys = [grid_key(solver.canonical_form(board)[0]) for board in corpus]
+    canonical_seconds = (time.perf_counter() - started) / len(corpus)
+    print(f'corpus: {len(corpus)} puzzles, {len(corpus) - len(set(canonical_keys))} isomorphic to an earlier one')
+    print(f'canonical_form: {canonical_seconds * 1000:.2f} ms per grid')
+
+    plain_cache = ResultCache(max_entries=len(corpus) + args.requests)
+    canonical_cache = ResultCache(max_entries=len(corpus) + args.requests)
+    for board in corpus:
+        plain_cache.put(grid_key(board), solve_result(board))
+        get_or_solve_canonical(canonical_cache, board, solve_result)
+    for cache in (plain_cache, canonical_cache):
+        cache.hits = cache.misses = 0
+
+    requests = [random.choice(corpus) for _ in range(args.requests)]
+    requests = [board if random.random() < args.exact_share else random_isomorph(board) for board in requests]
+
+    # plain cache: only exact repeats hit
+    started = time.perf_counter()
+    for board in requests:
+        plain_cache.get_or_compute(grid_key(board), lambda: solve_result(board))
+    plain_seconds = time.perf_counter() - started
+
+    # canonical cache: every isomorph of a solved puzzle hits, and its solution is checked against the request's givens
+    wrong = 0
+    started = time.perf_counter()
+    for board in requests:
+        solution = get_or_solve_canonical(canonical_cache, board, solve_result)["solution"]
+        if solution is None or any(board[r][c] not in (-1, solution[r][c]) for r in range(9) for c in range(9)):
+            wrong += 1
+    canonical_seconds = time.perf_counter() - started
+
+    for name, cache, seconds in (('plain', plain_cache, plain_seconds), ('canonical', canonical_cache, canonical_seconds)):
+        stats = cache.stats()
+        print(f'{name:>10}: hit rate {stats["hit_rate"]:.1%} ({stats["hits"]} hits, {stats["misses"]} misses), '
+              f'{seconds / len(requests) * 1000:.2f} ms per request')
+    print(f'canonical solutions not matching their request: {wrong}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# cross-check the csp and dlx engines against each other and against the expected solutions in csv_inputs,
+# plus a set of randomly generated puzzles
+# usage (from backend/): python -m benchmarks.cross_check [--random N] [--seed S]
+# exits with status 1 if any engine disagrees
+import argparse
+import random
+import sys
+
+import solver
+from benchmarks.fixtures import csv_fixtures
+
+# whether a returned solution is a full grid that breaks no row, column, or grid constraint
+def is_valid_solution(solution: list):
+    try:
+        solver.validate_grid(solution)
+    except solver.InvalidGrid:
+        return False
+    return all(elem != -1 for row in solution for elem in row)
+
+# solve board with every engine and return a list of problems found (empty if they all agree)
+def check_board(name: str, board: list, expected: list = None):
+    problems = []
+    to_assign = {(r, c): [] for r in range(9) for c in range(9) if board[r][c] == -1}
+    results = {engine: solver.solve(board, to_assign, engine=engine) for engine in solver.ENGINES}
+
+    for engine, (solution, is_unique) in results.items():
+        # any solution returned has to keep the givens and satisfy every constraint
+        if solution is not None:
+            keeps_givens = all(board[r][c] in (-1, solution[r][c]) for r in range(9) for c in range(9))
+            if not keeps_givens or not is_valid_solution(solution):
+                problems.append(f'{name}: {engine} returned an invalid solution')
+        if expected is not None and solution != expected:
+            problems.append(f'{name}: {engine} solution does not match the expected solution')
+
+    # the engines may find different solutions to a puzzle with several, but must agree on whether one exists and is unique
+    outcomes = {engine: (solution is None, is_unique) for engine, (solution, is_unique) in results.items()}
+    if len(set(outcomes.values())) > 1:
+        problems.append(f'{name}: engines disagree on (no solution, unique): {outcomes}')
+    # and a unique solution is the same for everyone
+    if all(is_unique for _, is_unique in results.values()):
+        if len({str(solution) for solution, _ in results.values()}) > 1:
+            problems.append(f'{name}: engines found different unique solutions')
+    return problems
+
+# random puzzles: a generated full board with some cells removed, and every third one with a (possibly conflicting) extra given
+def random_boards(count: int):
+    for index in range(count):
+        board, _ = solver.solve([[-1] * 9 for _ in range(9)], {}, randomize=True)
+        for cell in random.sample(range(81), random.randint(30, 55)):
+            board[cell // 9][cell % 9] = -1
+        if index % 3 == 0:
+            cell = random.randrange(81)
+            board[cell // 9][cell % 9] = random.randint(1, 9)
+        yield f'random_{index}', board
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='cross-check the solver engines')
+    arg_parser.add_argument('--random', type=int, default=100, help='number of random puzzles to check')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+    random.seed(args.seed)
+
+    problems = []
+    checked = 0
+    for name, board, expected in csv_fixtures():
+        # skip fixtures that aren't 9 x 9 boards
+        if board is None:
+            continue
+        problems += check_board(name, board, expected)
+        checked += 1
+    for name, board in random_boards(args.random):
+        problems += check_board(name, board)
+        checked += 1
+
+    for problem in problems:
+        print(problem)
+    print(f'checked {checked} boards with engines {", ".join(solver.ENGINES)}: {len(problems)} problems')
+    sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
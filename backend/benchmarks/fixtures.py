@@ -0,0 +1,58 @@
+# helpers for loading the puzzles in csv_inputs, shared by the benchmark scripts
+import os
+
+CSV_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'csv_inputs')
+
+# read a 9-line, comma-separated board (-1 for empty cells), returns None if the file isn't a valid 9 x 9 board
+def load_csv_board(path: str):
+    board = []
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line == '':
+                continue
+            try:
+                board.append([int(elem) for elem in line.split(',')])
+            except ValueError:
+                return None
+
+    if len(board) != 9 or any(len(row) != 9 for row in board):
+        return None
+    if any(elem != -1 and not 1 <= elem <= 9 for row in board for elem in row):
+        return None
+    return board
+
+# read a space-separated solution file, returns None if it doesn't exist
+def load_solution(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return [[int(elem) for elem in line.split()] for line in file if line.strip() != '']
+
+# yield (name, board, expected solution) for every *_input.csv fixture, in name order
+# invalid fixtures are included with board set to None when they can't be parsed as a 9 x 9 board
+def csv_fixtures():
+    for filename in sorted(os.listdir(CSV_DIR)):
+        if not filename.endswith('.csv'):
+            continue
+        name = filename[:-len('.csv')]
+        board = load_csv_board(os.path.join(CSV_DIR, filename))
+        solution = load_solution(os.path.join(CSV_DIR, name.replace('input', 'solution') + '.txt'))
+        yield name, board, solution
+
+IMAGE_DIR = os.path.join(os.path.dirname(CSV_DIR), 'image_inputs')
+HARD_PUZZLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hard_puzzles.txt')
+
+# yield (name, board) for every puzzle in hard_puzzles.txt, named by line order
+def hard_puzzles():
+    from bulk_solve import read_line_puzzles
+
+    with open(HARD_PUZZLES_PATH) as file:
+        for index, board in enumerate(read_line_puzzles(file)):
+            yield f'hard_{index}', board
+
+# yield (name, path) for every image in image_inputs, in name order
+def image_fixtures():
+    for filename in sorted(os.listdir(IMAGE_DIR)):
+        if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            yield os.path.splitext(filename)[0], os.path.join(IMAGE_DIR, filename)
@@ -0,0 +1,39 @@
+# memory use of the trail-based engine on the csv_inputs puzzles
+# usage (from backend/): python -m benchmarks.memory_report
+import gc
+import time
+import tracemalloc
+
+import solver
+from benchmarks.fixtures import csv_fixtures
+
+# the current solve path
+def trail_solve(board: list):
+    to_assign = {(r, c): [] for r in range(9) for c in range(9) if board[r][c] == -1}
+    solver.solve(board, to_assign)
+
+# run fn(board) under tracemalloc, returns (seconds, peak traced bytes, gen-0 collections)
+# gen-0 collections are triggered every ~700 net container allocations, so they track how many lists/dicts the search creates
+def measure(fn, board: list):
+    gc.collect()
+    collections_before = gc.get_stats()[0]['collections']
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(board)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    collections = gc.get_stats()[0]['collections'] - collections_before
+    return elapsed, peak, collections
+
+def main():
+    print(f"{'puzzle':<24}{'time (ms)':>12}{'peak (KiB)':>12}{'gen0 gcs':>10}")
+    for name, board, _ in csv_fixtures():
+        # skip fixtures that aren't 9 x 9 boards
+        if board is None:
+            continue
+        elapsed, peak, collections = measure(trail_solve, board)
+        print(f"{name:<24}{elapsed * 1000:>12.2f}{peak / 1024:>12.1f}{collections:>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# benchmark digit recognition on the images in image_inputs: one model call per cell (the old get_digits)
+# against one batched call per image
+# usage (from backend/): python -m benchmarks.ocr_benchmark [--repeat N]
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+import read_image
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'image_inputs')
+
+# the pre-batching get_digits: 81 separate model.predict calls with batch size 1 (needs the default keras runtime)
+def per_cell_digits(cells):
+    digits = []
+    for curr_cell in cells:
+        resized = cv2.resize(curr_cell, (28, 28), interpolation=cv2.INTER_AREA)
+        cell_thresh = cv2.adaptiveThreshold(resized, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 8)
+        model_input = cell_thresh.reshape(1, 28, 28, 1).astype('float32') / 255.0
+        predicted_digit = np.argmax(read_image.get_model().predict(model_input, verbose=0)[0])
+        digits.append(-1 if predicted_digit == 0 else int(predicted_digit))
+    return [digits[row_index * 9:row_index * 9 + 9] for row_index in range(9)]
+
+# best of repeat runs of fn(), in milliseconds, along with its last result
+def time_best(fn, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='per-cell vs batched digit recognition')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    paths = [os.path.join(IMAGE_DIR, filename) for filename in sorted(os.listdir(IMAGE_DIR))]
+
+    print(f"{'image':<24}{'per cell (ms)':>15}{'batched (ms)':>15}{'empty skipped':>15}{'same digits':>13}")
+    for path in paths:
+        cells = read_image.split_into_cells(read_image.process_outer_board(cv2.imread(path, 0)))
+        per_cell_ms, expected = time_best(lambda: per_cell_digits(cells), args.repeat)
+        batched_ms, digits = time_best(lambda: read_image.get_digits(cells), args.repeat)
+        skipped = int(read_image.find_empty_cells(read_image.preprocess_cells(cells)).sum())
+        print(f"{os.path.basename(path):<24}{per_cell_ms:>15.1f}{batched_ms:>15.1f}{skipped:>15}{str(digits == expected):>13}")
+
+if __name__ == '__main__':
+    main()
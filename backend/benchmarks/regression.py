@@ -0,0 +1,220 @@
+# benchmark and regression harness: runs solve(), generate_board(), and the image parser over the fixtures and larger corpora,
+# checks the results, and reports latency percentiles, throughput, and peak memory for each suite
+# usage (from backend/):
+#   python -m benchmarks.regression                                  # run and print a report
+#   python -m benchmarks.regression --save benchmarks/baseline.json  # store the results as a baseline
+#   python -m benchmarks.regression --compare benchmarks/baseline.json
+# a comparison run exits with status 1 if any check fails, or if a suite got slower or used more memory than its baseline
+# by more than the tolerance. suites:
+#   solve/csv/<engine>:       csv_inputs, checked against the *_solution.txt files (invalid boards must have no solution)
+#   solve/hard/<engine>:      hard_puzzles.txt, each must have exactly one solution
+#   solve/generated/<engine>: puzzles from generate_board() with a fixed seed, each must have exactly one solution
+#   solve/16x16/<engine>:     16 x 16 puzzles from generate_board(box=4) with a fixed seed, each must have exactly one solution
+#   generate:                 generate_board() itself, each board must have exactly one solution
+#   parser:                   read_image.parser() on image_inputs (skipped if opencv or the model runtime isn't installed),
+#                             checked against the grids stored in the baseline
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import solver
+from benchmarks.fixtures import csv_fixtures, hard_puzzles, image_fixtures
+
+# a returned grid is a solution of board if it keeps the givens and satisfies every constraint
+def is_solution_of(solution: list, board: list):
+    if solution is None or not solver.is_valid_grid(solution) or any(elem == -1 for row in solution for elem in row):
+        return False
+    keeps_givens = all(board[r][c] in (-1, solution[r][c]) for r in range(len(board)) for c in range(len(board)))
+    return keeps_givens and solver.build_state(solution, {}) is not None
+
+def solve_board(board: list, engine: str):
+    to_assign = {(r, c): [] for r in range(len(board)) for c in range(len(board)) if board[r][c] == -1}
+    return solver.solve(board, to_assign, engine=engine)
+
+# each suite is a list of cases (name, run, check): run() does the timed work, and check(result) returns a problem
+# description or None; results that should stay the same between runs (e.g. parsed grids) can be returned by check as
+# ('output', value) to be stored in the baseline and compared
+def csv_cases(engine: str):
+    cases = []
+    for name, board, expected in csv_fixtures():
+        if board is None:
+            continue
+
+        def check(result, board=board, expected=expected):
+            solution, _ = result
+            if expected is not None:
+                return None if solution == expected else 'solution does not match the solution file'
+            # boards without a solution file are either full or invalid: a full board solves to itself, an invalid one not at all
+            if all(elem != -1 for row in board for elem in row) and solver.build_state(board, {}) is not None:
+                return None if solution == board else 'full board did not solve to itself'
+            return None if solution is None else 'invalid board was solved'
+        cases.append((name, lambda board=board: solve_board(board, engine), check))
+    return cases
+
+# cases that must have exactly one solution
+def unique_cases(boards, engine: str):
+    def check(result, board):
+        solution, is_unique = result
+        if not is_solution_of(solution, board):
+            return 'no valid solution returned'
+        return None if is_unique else 'solution reported as not unique'
+    return [(name, lambda board=board: solve_board(board, engine), lambda result, board=board: check(result, board)) for name, board in boards]
+
+def generated_boards(count: int, seed: int, box: int = 3):
+    random.seed(seed)
+    return [(f'generated_{index}', solver.generate_board(box=box)) for index in range(count)]
+
+def generate_cases(count: int):
+    def check(board):
+        return None if solver.count_solutions(board, 2) == 1 else 'generated board does not have exactly one solution'
+    return [(f'generate_{index}', solver.generate_board, check) for index in range(count)]
+
+# image cases, or None if the OCR stack can't be imported here
+def parser_cases():
+    try:
+        import read_image
+    except ImportError:
+        return None
+
+    def check(grid):
+        if not solver.is_valid_grid(grid):
+            return 'parser did not return a 9 x 9 grid'
+        return ('output', grid)
+    return [(name, lambda path=path: read_image.parser(path), check) for name, path in image_fixtures()]
+
+# value at percentile q (0-100) of sorted samples, by nearest rank
+def percentile(samples: list, q: float):
+    index = max(0, min(len(samples) - 1, round(q / 100 * len(samples) + 0.5) - 1))
+    return samples[index]
+
+# run every case repeat times for timing, then once more under tracemalloc for the suite's peak memory
+def run_suite(cases: list, repeat: int, measure_memory: bool):
+    latencies = []
+    failures = []
+    outputs = {}
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for name, run, check in cases:
+            case_started = time.perf_counter()
+            result = run()
+            latencies.append(time.perf_counter() - case_started)
+            problem = check(result)
+            if isinstance(problem, tuple):
+                outputs[name] = problem[1]
+            elif problem is not None and f'{name}: {problem}' not in failures:
+                failures.append(f'{name}: {problem}')
+    total = time.perf_counter() - started
+
+    peak = None
+    if measure_memory:
+        tracemalloc.start()
+        for _, run, _ in cases:
+            run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        # cases per second, including the checks
+        "throughput": len(latencies) / total,
+        "peak_kib": None if peak is None else peak / 1024,
+        "failures": failures,
+        "outputs": outputs,
+    }
+
+# problems of a run against a baseline: failed checks, changed outputs, and timings or memory beyond the tolerances
+# differences under min_ms are ignored, since sub-millisecond timings are mostly noise
+def compare(results: dict, baseline: dict, tolerance: float, memory_tolerance: float, min_ms: float):
+    problems = []
+    for suite, current in results.items():
+        problems += [f'{suite}: {failure}' for failure in current['failures']]
+        before = baseline.get(suite)
+        if before is None:
+            continue
+
+        for name, output in before['outputs'].items():
+            if name in current['outputs'] and current['outputs'][name] != output:
+                problems.append(f'{suite}: {name} output changed')
+
+        for key in ('p50_ms', 'p90_ms'):
+            if current[key] > before[key] * (1 + tolerance) and current[key] - before[key] > min_ms:
+                problems.append(f'{suite}: {key} regressed from {before[key]:.2f} to {current[key]:.2f}')
+        if current['throughput'] < before['throughput'] * (1 - tolerance):
+            problems.append(f"{suite}: throughput regressed from {before['throughput']:.1f}/s to {current['throughput']:.1f}/s")
+        if current['peak_kib'] is not None and before['peak_kib'] is not None and current['peak_kib'] > before['peak_kib'] * (1 + memory_tolerance):
+            problems.append(f"{suite}: peak memory regressed from {before['peak_kib']:.0f} KiB to {current['peak_kib']:.0f} KiB")
+    return problems
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='benchmark and regression harness')
+    arg_parser.add_argument('--engines', nargs='+', choices=solver.ENGINES, default=list(solver.ENGINES))
+    arg_parser.add_argument('--generated', type=int, default=50, help='generated puzzles to solve')
+    arg_parser.add_argument('--large', type=int, default=5, help='generated 16 x 16 puzzles to solve')
+    arg_parser.add_argument('--generate', type=int, default=10, help='generate_board() calls to time')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='timed runs of each solve case')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--suites', nargs='+', help='only run suites whose name starts with one of these')
+    arg_parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    arg_parser.add_argument('--save', metavar='PATH', help='write the results as a baseline')
+    arg_parser.add_argument('--compare', metavar='PATH', help='compare against a baseline and fail on regressions')
+    arg_parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown (default 0.25)')
+    arg_parser.add_argument('--memory-tolerance', type=float, default=0.10, help='allowed relative growth of peak memory (default 0.10)')
+    arg_parser.add_argument('--min-ms', type=float, default=0.1, help='ignore latency differences smaller than this')
+    args = arg_parser.parse_args()
+
+    generated = generated_boards(args.generated, args.seed)
+    large = generated_boards(args.large, args.seed, box=4)
+    suites = []
+    for engine in args.engines:
+        suites.append((f'solve/csv/{engine}', csv_cases(engine), args.repeat))
+        suites.append((f'solve/hard/{engine}', unique_cases(list(hard_puzzles()), engine), args.repeat))
+        suites.append((f'solve/generated/{engine}', unique_cases(generated, engine), args.repeat))
+        suites.append((f'solve/16x16/{engine}', unique_cases(large, engine), args.repeat))
+    suites.append(('generate', generate_cases(args.generate), 1))
+    suites.append(('parser', parser_cases(), 1))
+
+    results = {}
+    print(f"{'suite':<24}{'cases':>7}{'p50 (ms)':>10}{'p90 (ms)':>10}{'p99 (ms)':>10}{'max (ms)':>10}{'per sec':>10}{'peak (KiB)':>12}")
+    for name, cases, repeat in suites:
+        if args.suites and not any(name.startswith(prefix) for prefix in args.suites):
+            continue
+        # case: optional dependencies missing (the image parser)
+        if cases is None:
+            print(f'{name:<24}skipped: opencv or the model runtime is not installed')
+            continue
+
+        random.seed(args.seed)
+        result = run_suite(cases, repeat, not args.no_memory)
+        results[name] = result
+        peak = '-' if result['peak_kib'] is None else f"{result['peak_kib']:.0f}"
+        print(f"{name:<24}{result['count']:>7}{result['p50_ms']:>10.2f}{result['p90_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+              f"{result['max_ms']:>10.2f}{result['throughput']:>10.1f}{peak:>12}")
+        for failure in result['failures']:
+            print(f'  FAIL {failure}')
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "suites": results}, file, indent=2)
+        print('saved baseline to', args.save)
+
+    problems = [f'{suite}: {failure}' for suite, result in results.items() for failure in result['failures']]
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['suites']
+        problems = compare(results, baseline, args.tolerance, args.memory_tolerance, args.min_ms)
+        for problem in problems:
+            print('REGRESSION', problem)
+        print(f'{len(problems)} regressions against', args.compare)
+    sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
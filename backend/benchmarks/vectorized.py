@@ -0,0 +1,70 @@
+# per-board Python path against the vectorized NumPy boards (board_array.py) on a batch of generated puzzles
+# times candidate computation, validation, and solving both ways, and checks that they agree
+# usage (from backend/): python -m benchmarks.vectorized [--boards N] [--seed S]
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+import board_array
+import solver
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+def scalar_candidates(grids: list):
+    return [state.cands if state is not None else None for state in (solver.build_state(grid, {}) for grid in grids)]
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='per-board solver against vectorized numpy boards')
+    arg_parser.add_argument('--boards', type=int, default=1000, help='generated puzzles in the batch')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+    random.seed(args.seed)
+
+    grids = [solver.generate_board() for _ in range(args.boards)]
+    # a few broken boards, so validation has something to reject
+    for grid in grids[::50]:
+        grid[0][0], grid[0][1] = 5, 5
+    problems = []
+
+    print(f"{'step':<14}{'per board (s)':>15}{'vectorized (s)':>16}{'speedup':>9}")
+    def report(step, scalar_seconds, vector_seconds):
+        print(f'{step:<14}{scalar_seconds:>15.3f}{vector_seconds:>16.3f}{scalar_seconds / vector_seconds:>8.1f}x')
+
+    cells, convert_seconds = timed(lambda: board_array.from_grids(grids))
+    print(f'from_grids: {convert_seconds * 1000:.1f} ms for {len(grids)} boards')
+
+    scalar_valid, scalar_seconds = timed(lambda: [solver.build_state(grid, {}) is not None for grid in grids])
+    vector_valid, vector_seconds = timed(lambda: board_array.validate(cells))
+    report('validate', scalar_seconds, vector_seconds)
+    if scalar_valid != vector_valid.tolist():
+        problems.append('validate disagrees with build_state')
+
+    scalar_cands, scalar_seconds = timed(lambda: scalar_candidates(grids))
+    vector_cands, vector_seconds = timed(lambda: board_array.candidates(cells))
+    report('candidates', scalar_seconds, vector_seconds)
+    for index, cands in enumerate(scalar_cands):
+        if cands is not None and cands != vector_cands[index].tolist():
+            problems.append(f'candidates of board {index} disagree')
+
+    scalar_results, scalar_seconds = timed(lambda: [solver.solve_grid(grid) for grid in grids])
+    vector_results, vector_seconds = timed(lambda: board_array.solve_boards(grids))
+    report('solve', scalar_seconds, vector_seconds)
+    for index, (scalar, vector) in enumerate(zip(scalar_results, vector_results)):
+        # boards with several solutions may legitimately return different ones
+        if scalar['status'] != vector['status'] or (scalar['status'] == 'unique' and scalar['solution'] != vector['solution']):
+            problems.append(f'solve results of board {index} disagree')
+    _, status = board_array.propagate(cells[vector_valid])
+    print(f'propagation alone solved {np.count_nonzero(status == board_array.STATUS_SOLVED)} of {len(status)} valid boards')
+
+    for problem in problems:
+        print('FAIL', problem)
+    sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
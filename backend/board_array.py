@@ -0,0 +1,123 @@
+# vectorized boards: a batch of 9 x 9 boards held in NumPy arrays, so candidates, validation, and singles propagation for
+# thousands of boards are a handful of array operations instead of a Python loop per board and cell
+# a batch is an (n, 81) uint8 array of cells in row-major order with 0 for empty (instead of -1), and candidate masks are an
+# (n, 81) uint16 array with the same bits as solver.py (value v is bit v - 1)
+import numpy as np
+
+import solver
+
+# peers of each cell (81 x 20) and cells of each unit (27 x 9: rows, then columns, then grids), as in solver.PEERS and solver.UNITS
+PEER_TABLE = np.array(solver.PEERS, dtype=np.intp)
+UNIT_TABLE = np.array(solver.UNITS, dtype=np.intp)
+
+# bit of each cell value, 0 for an empty cell
+VALUE_BITS = np.array([0] + [1 << (value - 1) for value in range(1, 10)], dtype=np.uint16)
+# shifts that move the bit of each value 1-9 down to bit 0
+VALUE_SHIFTS = np.arange(9, dtype=np.uint16)
+# number of candidates in each mask, and the value of each single-candidate mask (0 for the others)
+POPCOUNT = np.array(solver.BIT_COUNT, dtype=np.uint8)
+SINGLE_VALUE = np.array([solver.MASK_VALUES[mask][0] if solver.BIT_COUNT[mask] == 1 else 0 for mask in range(solver.ALL_VALUES + 1)], dtype=np.uint8)
+
+# propagation status of each board
+STATUS_SOLVED = 0  # every cell filled by singles, so the solution is unique
+STATUS_STUCK = 1  # no single left, the board needs a search
+STATUS_CONTRADICTION = 2  # the board has no solution
+
+# (n, 81) cells from a list of 9 x 9 grids (-1 for empty), raises ValueError if they aren't all 9 x 9 grids of -1 and 1-9
+def from_grids(grids: list):
+    if len(grids) == 0:
+        return np.zeros((0, 81), dtype=np.uint8)
+    values = np.asarray(grids, dtype=np.int16)
+    if values.ndim != 3 or values.shape[1:] != (9, 9):
+        raise ValueError('expected a list of 9 x 9 grids')
+    if ((values < -1) | (values == 0) | (values > 9)).any():
+        raise ValueError('cells must be -1 or 1-9')
+    return np.where(values == -1, 0, values).astype(np.uint8).reshape(len(values), 81)
+
+# list of 9 x 9 grids (-1 for empty) from (n, 81) cells
+def to_grids(cells):
+    grids = cells.astype(np.int16).reshape(-1, 9, 9)
+    grids[grids == 0] = -1
+    return grids.tolist()
+
+# (n, 27) used-value mask of every unit
+def unit_masks(cells):
+    return np.bitwise_or.reduce(VALUE_BITS[cells[:, UNIT_TABLE]], axis=2)
+
+# (n, 81) candidate mask of every cell: the values none of its peers hold, or 0 for a filled cell
+def candidates(cells):
+    used = np.bitwise_or.reduce(VALUE_BITS[cells[:, PEER_TABLE]], axis=2)
+    return np.where(cells == 0, ~used & solver.ALL_VALUES, 0).astype(np.uint16)
+
+# (n,) bools, True for each board whose filled cells don't repeat a value in any row, column, or grid
+# a unit repeats a value exactly when it has more filled cells than values in its used mask
+def validate(cells):
+    unit_cells = cells[:, UNIT_TABLE]
+    used = np.bitwise_or.reduce(VALUE_BITS[unit_cells], axis=2)
+    return (POPCOUNT[used] == np.count_nonzero(unit_cells, axis=2)).all(axis=1)
+
+# fill in naked and hidden singles on every board until none is left, returns (cells, status): a filled-in copy of the
+# cells, and one of the STATUS_* values per board
+# all boards take each step together, and boards drop out of the batch once they stop changing
+# note: the boards should already be valid (see validate)
+def propagate(cells):
+    cells = cells.copy()
+    dead = np.zeros(len(cells), dtype=bool)
+    active = np.arange(len(cells))
+    while len(active):
+        board_cells = cells[active]
+        cands = candidates(board_cells)
+        empty = board_cells == 0
+
+        # case: an empty cell without candidates
+        dead_now = (empty & (cands == 0)).any(axis=1)
+
+        # naked singles: empty cells with one candidate
+        new_cells = np.where(empty & (POPCOUNT[cands] == 1), SINGLE_VALUE[cands], board_cells)
+
+        # hidden singles: values missing from a unit that fit in exactly one of its empty cells
+        fits = (cands[:, UNIT_TABLE][..., None] >> VALUE_SHIFTS) & 1  # (k, 27 units, 9 cells, 9 values)
+        counts = fits.sum(axis=2)  # (k, 27 units, 9 values)
+        missing = ((unit_masks(board_cells)[..., None] >> VALUE_SHIFTS) & 1) == 0  # (k, 27 units, 9 values)
+        # case: a value missing from a unit has nowhere to go
+        dead_now |= (missing & (counts == 0)).any(axis=(1, 2))
+        board, unit, value = np.nonzero(missing & (counts == 1))
+        position = fits[board, unit, :, value].argmax(axis=1)
+        new_cells[board, UNIT_TABLE[unit, position]] = value + 1
+
+        # case: two singles put the same value in one unit
+        dead_now |= ~validate(new_cells)
+
+        changed = (new_cells != board_cells).any(axis=1)
+        cells[active] = new_cells
+        dead[active[dead_now]] = True
+        active = active[changed & ~dead_now]
+
+    solved = (cells != 0).all(axis=1)
+    status = np.where(dead, STATUS_CONTRADICTION, np.where(solved, STATUS_SOLVED, STATUS_STUCK)).astype(np.uint8)
+    return cells, status
+
+# solve many grids with one vectorized propagation for the whole batch, searching (with solver.solve_grid) only the boards
+# that singles can't finish. returns one solver.solve_grid-style result per grid, in order
+# note: boards of other sizes than 9 x 9 are handed to solver.solve_grid as they are
+def solve_boards(grids: list, engine: str = 'csp'):
+    results = [{"status": "invalid", "solution": None} for _ in grids]
+    for index, grid in enumerate(grids):
+        if solver.is_valid_grid(grid) and len(grid) != 9:
+            results[index] = solver.solve_grid(grid, engine)
+    indices = [index for index, grid in enumerate(grids) if solver.is_valid_grid(grid, (9,))]
+    cells = from_grids([grids[index] for index in indices])
+    valid = validate(cells)
+    filled, status = propagate(cells)
+
+    for position, index in enumerate(indices):
+        if not valid[position]:
+            continue
+        if status[position] == STATUS_SOLVED:
+            results[index] = {"status": "unique", "solution": to_grids(filled[position])[0]}
+        elif status[position] == STATUS_CONTRADICTION:
+            results[index] = {"status": "none", "solution": None}
+        else:
+            # the singles found so far are forced, so searching from the filled-in board finds the same solutions
+            results[index] = solver.solve_grid(to_grids(filled[position])[0], engine)
+    return results
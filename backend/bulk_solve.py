@@ -0,0 +1,149 @@
+# command-line bulk solver for puzzle files too large to load into memory
+# usage (from backend/):
+#   python bulk_solve.py puzzles.txt -o solutions.txt
+#   python bulk_solve.py csv_inputs/hard_input_1.csv
+#   python bulk_solve.py puzzles.txt --count-only
+#
+# input formats:
+#   line: one puzzle per line as 81 characters, 1-9 for givens and 0 or . for empty cells (lines starting with # are skipped)
+#   csv:  the csv_inputs format, 9 comma-separated rows with -1 for empty cells; several boards are separated by blank lines.
+#         4 x 4, 16 x 16, and 25 x 25 boards are read the same way
+#
+# output is one line per puzzle, in input order: "<status>\t<81-char solution>", or just "<status>" with --count-only,
+# where status is unique, multiple, none, or invalid. solutions of boards larger than 9 x 9 are written comma-separated.
+# totals for each status are printed to stderr at the end.
+import argparse
+import itertools
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from solver import ENGINES, BATCH_STATUSES, BOARD_SIZES, solve_grid
+
+# vectorized solving of whole chunks, used when numpy is installed
+try:
+    import board_array
+except ImportError:
+    board_array = None
+
+# parse an 81-character puzzle line into a 9 x 9 grid, returns None if it isn't one
+def parse_line(line: str):
+    if len(line) != 81:
+        return None
+    grid = []
+    for row_index in range(9):
+        row = []
+        for char in line[row_index * 9:row_index * 9 + 9]:
+            if char in '.0':
+                row.append(-1)
+            elif '1' <= char <= '9':
+                row.append(int(char))
+            else:
+                return None
+        grid.append(row)
+    return grid
+
+# yield one grid (or None for an unparseable puzzle) per non-empty, non-comment line
+def read_line_puzzles(file):
+    for line in file:
+        line = line.strip()
+        if line == '' or line.startswith('#'):
+            continue
+        yield parse_line(line)
+
+# parse a group of csv rows into a square grid of a supported size, returns None if it isn't one
+def parse_csv_rows(rows: list):
+    try:
+        grid = [[int(elem) for elem in row.split(',')] for row in rows]
+    except ValueError:
+        return None
+    if len(grid) not in BOARD_SIZES or any(len(row) != len(grid) for row in grid):
+        return None
+    return grid
+
+# yield one grid (or None) per blank-line-separated group of csv rows, holding only the current group in memory
+def read_csv_puzzles(file):
+    rows = []
+    for line in file:
+        line = line.strip()
+        if line == '':
+            if rows:
+                yield parse_csv_rows(rows)
+                rows = []
+            continue
+        rows.append(line)
+    if rows:
+        yield parse_csv_rows(rows)
+
+# format a solved grid as one line, 81 characters for a 9 x 9 grid
+def format_solution(solution: list):
+    separator = '' if len(solution) <= 9 else ','
+    return separator.join(str(elem) for row in solution for elem in row)
+
+# solve a chunk of puzzles in a worker process, keeping the solution only if it's wanted
+# with numpy, the chunk is propagated as one batch and only the puzzles singles can't finish are searched one by one
+def solve_chunk(grids: list, engine: str, count_only: bool):
+    if board_array is not None:
+        chunk_results = board_array.solve_boards(grids, engine)
+    else:
+        chunk_results = [solve_grid(grid, engine) for grid in grids]
+
+    results = []
+    for result in chunk_results:
+        results.append((result['status'], None if count_only or result['solution'] is None else format_solution(result['solution'])))
+    return results
+
+# solve the puzzles chunk by chunk across a process pool, yielding (status, solution line) in input order
+# at most max_in_flight chunks are queued at once, so memory stays constant however long the input is
+def solve_stream(puzzles, engine: str, count_only: bool, workers: int, chunk_size: int):
+    max_in_flight = workers * 4
+    chunks = iter(lambda: list(itertools.islice(puzzles, chunk_size)), [])
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(solve_chunk, chunk, engine, count_only))
+            # wait on the oldest chunk once the window is full
+            if len(pending) >= max_in_flight:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Solve a file of sudoku puzzles in bulk.')
+    arg_parser.add_argument('input', help='puzzle file, or - for stdin')
+    arg_parser.add_argument('-o', '--output', default='-', help='output file (default: stdout)')
+    arg_parser.add_argument('--format', choices=('auto', 'line', 'csv'), default='auto', help='input format (auto: csv for .csv files, line otherwise)')
+    arg_parser.add_argument('--count-only', action='store_true', help='only check how many solutions each puzzle has, without printing them')
+    arg_parser.add_argument('--engine', choices=ENGINES, default='csp')
+    arg_parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes (default: number of cores)')
+    arg_parser.add_argument('--chunk-size', type=int, default=256, help='puzzles sent to a worker at a time')
+    args = arg_parser.parse_args()
+
+    input_format = args.format
+    if input_format == 'auto':
+        input_format = 'csv' if args.input.endswith('.csv') else 'line'
+
+    input_file = sys.stdin if args.input == '-' else open(args.input)
+    output_file = sys.stdout if args.output == '-' else open(args.output, 'w')
+    puzzles = read_csv_puzzles(input_file) if input_format == 'csv' else read_line_puzzles(input_file)
+
+    totals = dict.fromkeys(BATCH_STATUSES, 0)
+    try:
+        for status, solution in solve_stream(puzzles, args.engine, args.count_only, args.workers, args.chunk_size):
+            totals[status] += 1
+            if args.count_only:
+                output_file.write(status + '\n')
+            else:
+                output_file.write(f"{status}\t{solution or '-'}\n")
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    print(' '.join(f'{status}={count}' for status, count in totals.items()), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
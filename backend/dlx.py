@@ -0,0 +1,198 @@
+import math
+import random
+
+# exact-cover (Dancing Links / Algorithm X) sudoku solver
+# each candidate placement (row, col, value) is a DLX row that covers 4 of the 4 * size * size constraint columns
+# (324 on a 9 x 9 board):
+#   0-80:    cell (row, col) is filled
+#   81-161:  row has value
+#   162-242: column has value
+#   243-323: grid has value
+
+# number of constraint columns for a size x size board
+def num_columns(size: int):
+    return 4 * size * size
+
+# the 4 constraint columns covered by placing value in (row, col) on a size x size board
+def placement_columns(row_index: int, col_index: int, value: int, size: int = 9):
+    box = math.isqrt(size)
+    cells = size * size
+    grid_index = (row_index // box) * box + col_index // box
+    return (
+        row_index * size + col_index,
+        cells + row_index * size + value - 1,
+        2 * cells + col_index * size + value - 1,
+        3 * cells + grid_index * size + value - 1,
+    )
+
+# the dancing links matrix, stored as parallel arrays of node links instead of node objects
+# node 0 is the root, nodes 1-num_columns are the column headers, and every row node after that belongs to one placement
+class DancingLinks:
+    def __init__(self, num_columns: int):
+        # left, right, up, down links, the column header of each node, and the placement id of each row node
+        self.left = list(range(-1, num_columns))
+        self.right = list(range(1, num_columns + 2))
+        self.left[0] = num_columns
+        self.right[num_columns] = 0
+        self.up = list(range(num_columns + 1))
+        self.down = list(range(num_columns + 1))
+        self.column = list(range(num_columns + 1))
+        self.row_id = [-1] * (num_columns + 1)
+        # number of row nodes in each column
+        self.size = [0] * (num_columns + 1)
+
+    # append a row covering the given (0-based) columns, tagged with row_id
+    def add_row(self, row_id: int, columns: tuple):
+        first = len(self.left)
+        for offset, column in enumerate(columns):
+            node = first + offset
+            header = column + 1
+            self.column.append(header)
+            self.row_id.append(row_id)
+            # link into the bottom of the column
+            self.up.append(self.up[header])
+            self.down.append(header)
+            self.down[self.up[header]] = node
+            self.up[header] = node
+            self.size[header] += 1
+            # link into the row, which is circular
+            self.left.append(node - 1 if offset > 0 else first + len(columns) - 1)
+            self.right.append(node + 1 if offset < len(columns) - 1 else first)
+
+    # remove a column header and every row that intersects it
+    def cover(self, header: int):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[header]] = right[header]
+        left[right[header]] = left[header]
+        node = down[header]
+        while node != header:
+            other = right[node]
+            while other != node:
+                down[up[other]] = down[other]
+                up[down[other]] = up[other]
+                size[column[other]] -= 1
+                other = right[other]
+            node = down[node]
+
+    # exact inverse of cover, undone in the reverse order
+    def uncover(self, header: int):
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        node = up[header]
+        while node != header:
+            other = left[node]
+            while other != node:
+                size[column[other]] += 1
+                down[up[other]] = other
+                up[down[other]] = other
+                other = left[other]
+            node = up[node]
+        right[left[header]] = header
+        left[right[header]] = header
+
+    # algorithm X: always branch on the column with the fewest rows
+    # appends each solution (list of row ids) to solutions and returns True once limit solutions have been found
+    # budget (see solver.SearchBudget) is charged one node per call and aborts the search by raising once it runs out
+    def search(self, partial: list, solutions: list, limit: int, budget=None):
+        right, down, column, size = self.right, self.down, self.column, self.size
+        if budget is not None:
+            budget.spend()
+
+        # case: every column covered -> partial is an exact cover
+        if right[0] == 0:
+            solutions.append(partial[:])
+            return len(solutions) >= limit
+
+        # pick the column with the fewest remaining rows
+        best = right[0]
+        header = right[best]
+        while header != 0 and size[best] > 1:
+            if size[header] < size[best]:
+                best = header
+            header = right[header]
+
+        # case: a constraint can no longer be satisfied -> backtrack
+        if size[best] == 0:
+            return False
+
+        self.cover(best)
+        node = down[best]
+        while node != best:
+            partial.append(self.row_id[node])
+            other = right[node]
+            while other != node:
+                self.cover(column[other])
+                other = right[other]
+
+            done = self.search(partial, solutions, limit, budget)
+
+            other = self.left[node]
+            while other != node:
+                self.uncover(column[other])
+                other = self.left[other]
+            partial.pop()
+
+            if done:
+                self.uncover(best)
+                return True
+            node = down[node]
+        self.uncover(best)
+        return False
+
+# placement ids encode (row, col, value) as row * size * size + col * size + value - 1 (row * 81 + col * 9 + value - 1 on 9 x 9)
+def decode_placement(row_id: int, size: int = 9):
+    return row_id // (size * size), (row_id // size) % size, row_id % size + 1
+
+# build the exact cover matrix for a board (of any square size) and select the rows of its givens
+# returns None if the givens conflict with each other
+def build_matrix(board: list, randomize: bool = False):
+    size = len(board)
+    matrix = DancingLinks(num_columns(size))
+
+    # add the placements in random order so generated boards differ
+    row_ids = list(range(size * size * size))
+    if randomize:
+        random.shuffle(row_ids)
+    for row_id in row_ids:
+        matrix.add_row(row_id, placement_columns(*decode_placement(row_id, size), size))
+
+    # cover the columns of each given, which is only possible if no earlier given already covered them
+    covered = [False] * num_columns(size)
+    for row_index in range(size):
+        for col_index in range(size):
+            value = board[row_index][col_index]
+            if value == -1:
+                continue
+            columns = placement_columns(row_index, col_index, value, size)
+            if any(covered[column] for column in columns):
+                return None
+            for column in columns:
+                covered[column] = True
+                matrix.cover(column + 1)
+    return matrix
+
+# find up to limit solutions of a board (-1 for empty cells), returned as lists the size of the board
+def find_solutions(board: list, limit: int = 2, randomize: bool = False, budget=None):
+    matrix = build_matrix(board, randomize)
+    if matrix is None:
+        return []
+
+    covers = []
+    matrix.search([], covers, limit, budget)
+
+    solutions = []
+    for cover in covers:
+        solution = [row[:] for row in board]
+        for row_id in cover:
+            row_index, col_index, value = decode_placement(row_id, len(board))
+            solution[row_index][col_index] = value
+        solutions.append(solution)
+    return solutions
+
+# count the solutions of a board, stopping once limit have been found
+def count_solutions(board: list, limit: int = 2):
+    matrix = build_matrix(board)
+    if matrix is None:
+        return 0
+    covers = []
+    matrix.search([], covers, limit)
+    return len(covers)
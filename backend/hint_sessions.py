@@ -0,0 +1,71 @@
+import secrets
+import threading
+
+from result_cache import ResultCache
+from solver import build_state, find_hint, search, sync_state, SearchBudget
+
+# one puzzle being hinted: its search state, which is updated in place, and the solution it was solved to when the session started
+# the lock makes hints for the same session run one at a time, while other sessions go on in parallel
+class HintSession:
+    def __init__(self, state, solution: list):
+        self.state = state
+        self.solution = solution
+        self.lock = threading.Lock()
+
+    # whether every filled cell of grid agrees with the session's solution
+    def agrees_with(self, grid: list):
+        return all(elem == -1 or elem == self.solution[row_index][col_index]
+                   for row_index, row in enumerate(grid) for col_index, elem in enumerate(row))
+
+# search states of hint sessions, so consecutive hints for the same puzzle reuse the candidates (and the eliminations) the
+# previous hint worked out instead of starting over. each session is identified by a random token handed to the client,
+# and sessions are kept in an LRU with a time-to-live, so abandoned ones expire on their own.
+class HintSessions:
+    def __init__(self, max_sessions: int = 1000, ttl: float = 1800, time_limit: float = None):
+        # note: in memory only, sessions aren't JSON-serializable
+        self.sessions = ResultCache(max_sessions, ttl, name='hints')
+        self.time_limit = time_limit
+
+    # the next hint for grid as (cell, value, technique), or None if there is none, and the session token to send next time
+    # an unknown or expired token, or a grid that isn't the session's grid with more cells filled in, starts a new session.
+    # so does a grid whose new entries don't match the session's solution: an entry can fit the candidates and still be
+    # wrong, and then the new session's solve reports that the grid has no solution
+    def hint(self, grid: list, token: str = None):
+        budget = SearchBudget(self.time_limit)
+        session = self.sessions.get(token) if token is not None else None
+        if session is not None:
+            with session.lock:
+                if session.agrees_with(grid) and sync_state(session.state, grid):
+                    return self.next_hint(session, budget), token
+
+        session = self.start(grid, budget)
+        if session is None:
+            return None, secrets.token_urlsafe(16)
+        token = secrets.token_urlsafe(16)
+        self.sessions.put(token, session)
+        with session.lock:
+            return self.next_hint(session, budget), token
+
+    # a new session for grid, solved once up front, or None if the grid has no solution
+    def start(self, grid: list, budget: SearchBudget):
+        state = build_state(grid, {})
+        # case: the givens already break a row, column, or grid constraint
+        if state is None:
+            return None
+
+        solutions = []
+        search(state, solutions, 1, budget=budget)
+        if not solutions:
+            return None
+        return HintSession(state, solutions[0])
+
+    # the next hint of a session, the caller holds its lock
+    def next_hint(self, session: HintSession, budget: SearchBudget):
+        hint = find_hint(session.state, budget, session.solution)
+        # the session never backtracks past this point, so the trail can be dropped
+        session.state.trail_top = 0
+        return hint
+
+    # session count and how often a token found its session
+    def stats(self):
+        return self.sessions.stats()
@@ -0,0 +1,79 @@
+# solver metrics in the prometheus text format, exported by the /metrics route in app.py
+import threading
+
+from solver import SEARCH_COUNTERS
+
+# upper bounds in seconds of the solve duration histogram buckets
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+# totals over every solve: how many ended in each outcome, the search statistics and rule deductions they added up to,
+# and a histogram of how long they took
+class SolverMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.solves = {}  # (engine, outcome) -> count
+        self.totals = dict.fromkeys(SEARCH_COUNTERS, 0)
+        self.rules = {}  # rule name -> deductions
+        self.bucket_counts = [0] * len(DURATION_BUCKETS)
+        self.duration_count = 0
+        self.duration_sum = 0.0
+
+    # record one solve, where outcome is e.g. unique, multiple, none, cached, aborted, or invalid, and counters are the ones solve() filled in
+    def record(self, engine: str, outcome: str, seconds: float, counters: dict = None):
+        with self.lock:
+            self.solves[(engine, outcome)] = self.solves.get((engine, outcome), 0) + 1
+            for name, value in (counters or {}).items():
+                if name == 'max_depth':
+                    self.totals[name] = max(self.totals[name], value)
+                elif name in self.totals:
+                    self.totals[name] += value
+                else:
+                    self.rules[name] = self.rules.get(name, 0) + value
+
+            self.duration_count += 1
+            self.duration_sum += seconds
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    self.bucket_counts[index] += 1
+
+    # the metrics as prometheus text, followed by extra metrics given as (name, type, help, {label string: value})
+    def render(self, extra: list = ()):
+        with self.lock:
+            lines = [
+                '# HELP sudoku_solves_total Solve requests by engine and outcome.',
+                '# TYPE sudoku_solves_total counter',
+            ]
+            lines += [f'sudoku_solves_total{{engine="{engine}",outcome="{outcome}"}} {count}' for (engine, outcome), count in sorted(self.solves.items())]
+
+            for name in SEARCH_COUNTERS:
+                if name == 'max_depth':
+                    lines += [
+                        '# HELP sudoku_solver_max_depth Deepest search node reached by any solve.',
+                        '# TYPE sudoku_solver_max_depth gauge',
+                        f'sudoku_solver_max_depth {self.totals[name]}',
+                    ]
+                else:
+                    metric = f'sudoku_solver_{name}_total'
+                    lines += [f'# HELP {metric} Sum of the {name} search statistic over every solve.', f'# TYPE {metric} counter', f'{metric} {self.totals[name]}']
+
+            lines += [
+                '# HELP sudoku_solver_rule_deductions_total Deductions made by each propagation rule.',
+                '# TYPE sudoku_solver_rule_deductions_total counter',
+            ]
+            lines += [f'sudoku_solver_rule_deductions_total{{rule="{rule}"}} {count}' for rule, count in sorted(self.rules.items())]
+
+            lines += [
+                '# HELP sudoku_solve_duration_seconds Time taken by each solve request.',
+                '# TYPE sudoku_solve_duration_seconds histogram',
+            ]
+            lines += [f'sudoku_solve_duration_seconds_bucket{{le="{bound}"}} {count}' for bound, count in zip(DURATION_BUCKETS, self.bucket_counts)]
+            lines += [
+                f'sudoku_solve_duration_seconds_bucket{{le="+Inf"}} {self.duration_count}',
+                f'sudoku_solve_duration_seconds_sum {self.duration_sum}',
+                f'sudoku_solve_duration_seconds_count {self.duration_count}',
+            ]
+
+        for name, metric_type, help_text, values in extra:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+            lines += [f'{name}{{{labels}}} {value}' if labels else f'{name} {value}' for labels, value in values.items()]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,91 @@
+# numpy-only forward pass of the digit recognition model, so /image can run without loading tensorflow
+# everything is read from the .keras file itself, which is a zip archive: the layer structure from its config.json, and the
+# weights from its model.weights.h5 (with h5py, which is all this needs besides numpy)
+import io
+import json
+import os
+import re
+import zipfile
+
+import h5py
+import numpy as np
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+KERAS_MODEL_PATH = os.path.join(MODEL_DIR, 'new_digit_model.keras')
+
+# the snake_case form of a layer class name, as keras writes it (e.g. MaxPooling2D -> max_pooling2d)
+def to_snake_case(name: str):
+    name = re.sub(r'(.)([A-Z][a-z]+)', r'\1_\2', name)
+    return re.sub(r'([a-z])([A-Z])', r'\1_\2', name).lower()
+
+# the weights of each layer of a .keras archive, in layer order: keras stores a sequential model's weights under
+# layers/<name>/vars/<index>, where name is the layer's class name in snake_case, numbered _1, _2, ... from the second
+# layer of the same class on (the input layer isn't stored)
+def read_weights(archive: zipfile.ZipFile, layers: list):
+    weights = []
+    used = {}
+    with h5py.File(io.BytesIO(archive.read('model.weights.h5')), 'r') as file:
+        for layer in layers:
+            if layer['class_name'] == 'InputLayer':
+                weights.append([])
+                continue
+            name = to_snake_case(layer['class_name'])
+            used[name] = used.get(name, -1) + 1
+            if used[name] > 0:
+                name = f'{name}_{used[name]}'
+            variables = file.get(f'layers/{name}/vars')
+            weights.append([] if variables is None else [np.array(variables[key]) for key in sorted(variables, key=int)])
+    return weights
+
+# "valid" 2d convolution with stride 1 on a channels-last batch: (n, h, w, c) * (kh, kw, c, filters) -> (n, h', w', filters)
+def conv2d(x, kernel, bias):
+    windows = np.lib.stride_tricks.sliding_window_view(x, kernel.shape[:2], axis=(1, 2))
+    return np.einsum('nhwcij,ijcf->nhwf', windows, kernel, optimize=True) + bias
+
+# "valid" max pooling with a square pool and matching stride
+def max_pool(x, size: int):
+    n, h, w, c = x.shape
+    x = x[:, :h - h % size, :w - w % size, :]
+    return x.reshape(n, h // size, size, w // size, size, c).max(axis=(2, 4))
+
+def relu(x):
+    return np.maximum(x, 0)
+
+def softmax(x):
+    exps = np.exp(x - x.max(axis=1, keepdims=True))
+    return exps / exps.sum(axis=1, keepdims=True)
+
+ACTIVATIONS = {'linear': lambda x: x, 'relu': relu, 'softmax': softmax}
+
+# the digit model as a list of numpy layers, with the same predict_on_batch() as the keras model
+class NumpyDigitModel:
+    def __init__(self, layers: list):
+        # each layer is (class name, config, weights)
+        self.layers = layers
+
+    # read the layer configs and the weights from a .keras file
+    @classmethod
+    def load(cls, keras_path: str = KERAS_MODEL_PATH):
+        with zipfile.ZipFile(keras_path) as archive:
+            layers = json.loads(archive.read('config.json'))['config']['layers']
+            weights = read_weights(archive, layers)
+        return cls([(layer['class_name'], layer['config'], layer_weights) for layer, layer_weights in zip(layers, weights)])
+
+    # run a (n, 28, 28, 1) float32 batch through the network, returns (n, 10) class probabilities
+    def predict_on_batch(self, batch):
+        x = np.asarray(batch, dtype='float32')
+        for class_name, config, weights in self.layers:
+            if class_name == 'Conv2D':
+                x = ACTIVATIONS[config['activation']](conv2d(x, weights[0], weights[1]))
+            elif class_name == 'MaxPooling2D':
+                x = max_pool(x, config['pool_size'][0])
+            elif class_name == 'Flatten':
+                x = x.reshape(len(x), -1)
+            elif class_name == 'Dense':
+                x = ACTIVATIONS[config['activation']](x @ weights[0] + weights[1])
+            elif class_name in ('InputLayer', 'Dropout'):
+                # dropout only applies during training
+                continue
+            else:
+                raise ValueError(f'unsupported layer type for the numpy runtime: {class_name}')
+        return x
@@ -0,0 +1,145 @@
+# bounded process pool that the async server (asgi_app.py) runs its CPU-bound work in, plus the tasks it runs
+# every request holds one of a fixed number of slots while its task is queued or running, which bounds the queue: once every
+# slot is taken, run() raises QueueFull instead of queueing more work. while a task runs, run() also watches the connection,
+# and if the client disconnects it cancels the task if it hasn't started, or sets the slot's cancel flag so a running search stops.
+# note: kept apart from asgi_app so the worker processes only import this module and the solver, not the web app
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from solver import solve, canonical_form, SearchBudget, SearchAborted
+
+# raised by run() when every slot is taken, the caller should answer 429
+class QueueFull(Exception):
+    pass
+
+# raised by run() when the client disconnected before its task finished
+class ClientDisconnected(Exception):
+    pass
+
+# one flag per slot, shared with the worker processes (see init_worker)
+cancel_flags = None
+
+# process pool initializer, receives the shared cancel flags
+def init_worker(flags):
+    global cancel_flags
+    cancel_flags = flags
+
+# solve a grid within a time and node budget, stopping early if the slot's cancel flag is set
+# returns {"solution": ..., "is_unique": ..., "stats": search statistics}, or {"aborted": reason, "stats": ...} if the search was stopped
+def solve_task(grid: list, engine: str, time_limit: float, max_nodes: int, slot: int):
+    budget = SearchBudget(time_limit, max_nodes, cancelled=lambda: cancel_flags[slot] != 0)
+    to_assign = {(r, c): [] for r in range(len(grid)) for c in range(len(grid)) if grid[r][c] == -1}
+    counters = {}
+    try:
+        solution, is_unique = solve(grid, to_assign, engine=engine, counters=counters, budget=budget)
+    except SearchAborted as e:
+        return {"aborted": str(e), "stats": counters}
+    return {"solution": solution, "is_unique": is_unique, "stats": counters}
+
+# solve a grid within quick_nodes search nodes, and if it needs more, canonicalize it instead, both in the worker so the
+# event loop never runs canonical_form (see result_cache.get_or_solve_canonical for why only slow grids are canonicalized)
+# returns solve_task's result if the quick attempt finished or was stopped by the time limit or a cancel, otherwise
+# {"canonical": canonical grid, "transform": transform back to the grid, "stats": ...}
+def quick_solve_task(grid: list, engine: str, time_limit: float, quick_nodes: int, slot: int):
+    budget = SearchBudget(time_limit, quick_nodes, cancelled=lambda: cancel_flags[slot] != 0)
+    to_assign = {(r, c): [] for r in range(len(grid)) for c in range(len(grid)) if grid[r][c] == -1}
+    counters = {}
+    try:
+        solution, is_unique = solve(grid, to_assign, engine=engine, counters=counters, budget=budget)
+    except SearchAborted as e:
+        if budget.nodes <= quick_nodes:
+            return {"aborted": str(e), "stats": counters}
+        canonical, transform = canonical_form(grid)
+        return {"canonical": canonical, "transform": transform, "stats": counters}
+    return {"solution": solution, "is_unique": is_unique, "stats": counters}
+
+# parse the digits of an uploaded image, returns {"grid": 2d array of digits} or {"undecodable": message} if the upload isn't
+# an image opencv can decode, so the parent never has to import read_image to tell that apart from a failure
+# note: imported here so the OCR stack is only loaded by workers that parse images
+def parse_image_task(data: bytes):
+    from read_image import parse_image_bytes, UndecodableImage
+    try:
+        return {"grid": parse_image_bytes(data)}
+    except UndecodableImage as e:
+        return {"undecodable": str(e)}
+
+# wait until the ASGI server reports that the client has disconnected
+# note: only valid once the request body has been read, after which the next message is the disconnect
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+class OffloadPool:
+    def __init__(self, workers: int, slots: int):
+        self.workers = workers
+        self.slots = slots
+        self.executor = None
+        # workers are spawned rather than forked, so they don't inherit the server's threads and sockets
+        self.context = multiprocessing.get_context('spawn')
+        self.cancel_flags = self.context.RawArray('b', slots)
+        self.free_slots = list(range(slots))
+
+        self.submitted = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    # create the process pool, also done on first use
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=self.context, initializer=init_worker, initargs=(self.cancel_flags,))
+
+    # stop the worker processes, dropping queued tasks
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    # run fn(*args) in the pool and return its result, passing the request's slot as the last argument if cancellable
+    # receive is the ASGI receive channel of the request, watched for a disconnect while the task runs
+    # raises QueueFull if no slot is free, and ClientDisconnected if the client went away first
+    async def run(self, receive, fn, *args, cancellable: bool = False):
+        if not self.free_slots:
+            self.rejected += 1
+            raise QueueFull()
+        self.start()
+
+        slot = self.free_slots.pop()
+        self.cancel_flags[slot] = 0
+        self.submitted += 1
+        if cancellable:
+            args = args + (slot,)
+
+        # the slot only goes back to the free list once the task is really done, not when the request stops waiting for it
+        loop = asyncio.get_running_loop()
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self.free_slots.append, slot))
+
+        result = asyncio.wrap_future(future)
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            done, _ = await asyncio.wait((result, disconnect), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnect.cancel()
+
+        if result not in done:
+            # case: client went away -> drop the task if it hasn't started, otherwise ask it to stop
+            self.cancelled += 1
+            if not future.cancel():
+                self.cancel_flags[slot] = 1
+            result.cancel()
+            raise ClientDisconnected()
+        return result.result()
+
+    # slot usage and counts of submitted, rejected (429), and cancelled (client disconnected) tasks
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "slots": self.slots,
+            "busy_slots": self.slots - len(self.free_slots),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+        }
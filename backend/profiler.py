@@ -0,0 +1,46 @@
+# sampling profiler for a single thread, used by app.py to profile requests when PROFILE_DIR is set
+# a background thread looks at the profiled thread's stack every interval seconds and counts each distinct stack; the result
+# is written in the "folded" format (one "outer;inner;... count" line per stack) that flamegraph tools read
+import os
+import sys
+import threading
+from collections import Counter
+
+class SamplingProfiler:
+    def __init__(self, thread_id: int = None, interval: float = 0.005):
+        # profiles the thread that created it unless told otherwise
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='sampling-profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # sampling loop, each stack is recorded outermost frame first as "file:function" entries
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}')
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    # the samples in the folded format, most frequent stack first
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+    def write(self, path: str):
+        with open(path, 'w') as file:
+            file.write(self.folded())
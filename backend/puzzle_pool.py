@@ -0,0 +1,158 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from solver import generate_board, generate_puzzle, DIFFICULTIES
+
+# generate a puzzle for a difficulty bucket, returns None if none was found within the time budget
+# note: module-level so it can be pickled and run in a worker process
+def generate_for_bucket(difficulty: str, time_budget: float = 5.0):
+    board, _ = generate_puzzle(difficulty, time_budget, strict=True)
+    return board
+
+# a reservoir of pre-generated puzzles, so /generate can hand out a ready puzzle instead of generating one on the request thread
+# there is one bucket per difficulty level (see solver.DIFFICULTIES), and each holds between low_watermark and high_watermark puzzles: once a bucket drops below low_watermark, a background
+# thread refills it up to high_watermark using a process pool. if a bucket is empty, get() falls back to generating synchronously.
+# a bucket whose generation fails max_failures times in a row stops being refilled in the background; after that, each time
+# get() finds it low again buys it one more attempt, so a bucket that can't be filled doesn't keep a worker busy for good
+class PuzzlePool:
+    def __init__(self, buckets: tuple = DIFFICULTIES, low_watermark: int = 5, high_watermark: int = 20, workers: int = 1, max_failures: int = 3):
+        self.buckets = buckets
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.workers = workers
+        self.max_failures = max_failures
+        self.puzzles = {name: deque() for name in buckets}
+        # buckets that dropped below the low watermark and haven't been refilled to the high watermark yet
+        self.refilling = set(buckets)
+        # failed refills of each bucket since its last successful one
+        self.failures = dict.fromkeys(buckets, 0)
+
+        # guards puzzles and the counters below, and wakes the refill thread when a bucket runs low
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.running = False
+        self.thread = None
+        self.executor = None
+
+        self.hits = 0
+        self.misses = 0
+        self.refilled = 0
+        self.refill_failures = 0
+        self.refill_seconds = 0.0
+
+    # start the background refill thread, which begins by filling every bucket up to the high watermark
+    # note: does nothing if the pool is already running, so it can be called before every use
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.thread = threading.Thread(target=self.refill_loop, name='puzzle-pool-refill', daemon=True)
+        self.thread.start()
+
+    # stop the refill thread and its worker processes
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.wakeup.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    # pop a ready puzzle from a bucket (or from a random non-empty bucket if bucket is None)
+    # falls back to generating one on the calling thread if the bucket is empty
+    def get(self, bucket: str = None):
+        if bucket is not None and bucket not in self.buckets:
+            raise ValueError(f"unknown puzzle bucket '{bucket}', expected one of {tuple(self.buckets)}")
+
+        with self.lock:
+            if bucket is None:
+                stocked = [name for name, puzzles in self.puzzles.items() if puzzles]
+                name = random.choice(stocked) if stocked else None
+            else:
+                name = bucket if self.puzzles[bucket] else None
+
+            if name is not None:
+                board = self.puzzles[name].popleft()
+                self.hits += 1
+                if len(self.puzzles[name]) < self.low_watermark:
+                    self.refilling.add(name)
+                    self.wakeup.notify_all()
+                return board
+
+            self.misses += 1
+            self.refilling.update([bucket] if bucket is not None else self.buckets)
+            self.wakeup.notify_all()
+
+        # case: pool ran dry -> generate synchronously
+        if bucket is None:
+            return generate_board()
+        board, _ = generate_puzzle(bucket)
+        return board
+
+    # background thread: wait for a bucket to run low, then generate puzzles for it in the process pool until it's full
+    def refill_loop(self):
+        in_flight = {}
+        while True:
+            with self.lock:
+                while self.running and not self.refilling and not in_flight:
+                    self.wakeup.wait()
+                if not self.running:
+                    return
+                missing = {name: self.high_watermark - len(self.puzzles[name]) for name in self.refilling}
+
+            # keep up to `workers` generation tasks running, without asking for more puzzles than a bucket is missing
+            for name, count in missing.items():
+                pending = sum(1 for bucket, _ in in_flight.values() if bucket == name)
+                while len(in_flight) < self.workers and pending < count:
+                    in_flight[self.executor.submit(generate_for_bucket, name)] = (name, time.perf_counter())
+                    pending += 1
+
+            if not in_flight:
+                continue
+
+            # wait for the oldest task and add its puzzle
+            future = next(iter(in_flight))
+            name, started = in_flight.pop(future)
+            try:
+                board = future.result()
+            except Exception as e:
+                print("Error refilling puzzle pool:", str(e))
+                board = None
+
+            with self.lock:
+                self.refill_seconds += time.perf_counter() - started
+                if board is None:
+                    self.refill_failures += 1
+                    self.failures[name] += 1
+                else:
+                    self.failures[name] = 0
+                    if len(self.puzzles[name]) < self.high_watermark:
+                        self.puzzles[name].append(board)
+                        self.refilled += 1
+                if len(self.puzzles[name]) >= self.high_watermark or self.failures[name] >= self.max_failures:
+                    self.refilling.discard(name)
+
+    # pool metrics: puzzles ready per bucket, hits and misses of get(), and how many puzzles the refill thread has added
+    def metrics(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "sizes": {name: len(puzzles) for name, puzzles in self.puzzles.items()},
+                "low_watermark": self.low_watermark,
+                "high_watermark": self.high_watermark,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else None,
+                "refilled": self.refilled,
+                "refill_failures": self.refill_failures,
+                # puzzles added per second of worker time spent generating
+                "refill_rate": self.refilled / self.refill_seconds if self.refill_seconds else None,
+            }
@@ -1,9 +1,33 @@
 import cv2 # for image processing
 import numpy as np # for numerical processing
-import tensorflow as tf
-
-# import the model from the kaggle dataset, edited to include early stopping and more epochs
-model = tf.keras.models.load_model('new_digit_model.keras')
+import os
+import threading
+
+# the model from the kaggle dataset, edited to include early stopping and more epochs
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'new_digit_model.keras')
+
+# inference runtime: 'keras' loads the model with tensorflow, 'numpy' runs the same network in plain numpy, reading the
+# layers and weights straight from MODEL_PATH with h5py (see numpy_digit_model.py); no separate weights file is involved, so
+# the only way the numpy runtime fails to load is a missing MODEL_PATH or h5py, which raises on the first parsed image
+OCR_RUNTIME = os.environ.get('OCR_RUNTIME', 'keras')
+
+# the model is loaded on first use rather than at import time, so processes that never parse an image don't pay for tensorflow
+model = None
+model_lock = threading.Lock()
+
+# return the digit model, loading it on the first call
+def get_model():
+    global model
+    if model is None:
+        with model_lock:
+            if model is None:
+                if OCR_RUNTIME == 'numpy':
+                    from numpy_digit_model import NumpyDigitModel
+                    model = NumpyDigitModel.load(MODEL_PATH)
+                else:
+                    import tensorflow as tf
+                    model = tf.keras.models.load_model(MODEL_PATH)
+    return model
 
 # isolate the board from the rest of the image and warp to a flat perspective
 def process_outer_board(img):
@@ -68,47 +92,89 @@ def split_into_cells(warped):
             cells.append(cell)
     return cells
 
-# process the cells and return a 2d array of the digits
-def get_digits(cells):
-    digits = []
-    for i, curr_cell in enumerate(cells):
+# fraction of lit pixels in the middle of a thresholded cell below which the cell is treated as empty without asking the model
+EMPTY_CELL_DENSITY = 0.02
+# pixels trimmed from each side of a 28 x 28 cell before the density test, so grid lines along the edges don't count
+CELL_MARGIN = 4
+
+# preprocess the cells into one (n, 28, 28, 1) float32 batch matching the model's training data
+def preprocess_cells(cells):
+    thresholded = []
+    for curr_cell in cells:
         # resize to 28 x 28 input, matching model training data
         resized = cv2.resize(curr_cell, (28, 28), interpolation=cv2.INTER_AREA)
-        
+
         # create binary image with adaptive thresholding - white text on black background, matches training data
-        cell_thresh = cv2.adaptiveThreshold(resized, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                        cv2.THRESH_BINARY_INV, 11, 8)
-        
+        thresholded.append(cv2.adaptiveThreshold(resized, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                        cv2.THRESH_BINARY_INV, 11, 8))
+
         # note: could isolate the digit contour here, but unnecessary since noise and edges are represented in the dataset
-        
-        # format correctly for model input
-        model_input = cell_thresh.reshape(1, 28, 28, 1)
-        model_input = model_input.astype('float32') / 255.0
 
-        # predict digit
-        prediction = model.predict(model_input, verbose=0)
-        predicted_digit = np.argmax(prediction[0])
+    # stack into a single tensor and scale to 0-1
+    batch = np.stack(thresholded).astype('float32') / 255.0
+    return batch.reshape(-1, 28, 28, 1)
 
-        # add digit to array
-        if predicted_digit == 0:
-            digits.append(-1)
-        else:
-            digits.append(predicted_digit)
+# cheap emptiness test on a preprocessed batch: True for cells with (almost) no lit pixels away from the edges
+def find_empty_cells(batch):
+    centers = batch[:, CELL_MARGIN:28 - CELL_MARGIN, CELL_MARGIN:28 - CELL_MARGIN, 0]
+    return centers.mean(axis=(1, 2)) < EMPTY_CELL_DENSITY
 
-    # reshape to 2d array
-    digits = np.reshape(digits, (9, 9))
+# classify a preprocessed batch of cells with one model call, returns a flat array of digits with -1 for empty cells
+# cells that fail the density test are marked empty without being sent to the model
+def classify_cells(batch):
+    digits = np.full(len(batch), -1, dtype=int)
+    non_empty = ~find_empty_cells(batch)
 
-    # convert to regular int python array from numpy
-    digits = [[int(elem) for elem in row] for row in digits]
+    if non_empty.any():
+        # predict every remaining cell in a single batched inference call
+        predictions = get_model().predict_on_batch(batch[non_empty])
+        predicted = np.argmax(predictions, axis=1)
+        # the model predicts 0 for empty cells
+        digits[non_empty] = np.where(predicted == 0, -1, predicted)
 
     return digits
 
+# process the cells and return a 2d array of the digits
+def get_digits(cells):
+    digits = classify_cells(preprocess_cells(cells))
+
+    # reshape to 2d array and convert to regular int python array from numpy
+    return [[int(elem) for elem in row] for row in digits.reshape(9, 9)]
+
+# longest side, in pixels, that an image is scaled down to before the board search - phone photos are far larger than
+# the 450 x 450 warped board needs, and the contour search gets slower with every pixel
+MAX_IMAGE_SIDE = int(os.environ.get('MAX_IMAGE_SIDE', 1200))
+
+# scale a grayscale image down so its longest side is at most max_side (images that are already small enough are returned as is)
+def downscale(img, max_side: int = MAX_IMAGE_SIDE):
+    longest = max(img.shape[:2])
+    if longest <= max_side:
+        return img
+    scale = max_side / longest
+    return cv2.resize(img, (round(img.shape[1] * scale), round(img.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+
+# raised when an upload isn't an image opencv can decode
+class UndecodableImage(ValueError):
+    pass
+
+# decode an encoded image (jpg, png, ...) held in memory into a grayscale array, without touching the disk
+# data can be bytes or any buffer (e.g. a memoryview of the upload), which np.frombuffer wraps without copying
+def decode_image(data):
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise UndecodableImage('could not decode image')
+    return img
+
+# warp the board out of a grayscale image and preprocess its cells
+def image_to_cells(img):
+    warped = process_outer_board(downscale(img))
+    return split_into_cells(warped)
+
 # main function that takes in an image of a sudoku board and returns an array of digits
 def parser(file_path):
     img = cv2.imread(file_path, 0)
-    warped = process_outer_board(img)
-    cells = split_into_cells(warped)
-    digits = get_digits(cells)
-
-    return digits
+    return get_digits(image_to_cells(img))
 
+# same as parser, for an encoded image already in memory (e.g. an upload)
+def parse_image_bytes(data):
+    return get_digits(image_to_cells(decode_image(data)))
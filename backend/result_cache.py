@@ -0,0 +1,154 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from solver import canonical_form, invert_transform, SearchAborted
+
+# content-addressed key of a grid: the sha256 of its cells written out in row-major order ("." for empty)
+# cells of boards wider than 9 are comma-separated, since their values can take two digits
+def grid_key(grid: list):
+    separator = '' if len(grid) <= 9 else ','
+    text = separator.join('.' if elem == -1 else str(elem) for row in grid for elem in row)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+# content-addressed key of raw bytes (e.g. an uploaded image), accepts bytes or any buffer
+def bytes_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+# how many writes to the shared store happen between prunes of its expired and excess entries
+PRUNE_INTERVAL = 100
+
+# LRU cache of JSON-serializable results with a time-to-live and a bound on the number of entries
+# with a path, entries are also written to a SQLite file, so several worker processes can share results:
+# a miss in the in-memory LRU falls back to the file before counting as a miss
+class ResultCache:
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600, path: str = None, name: str = 'results'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expiry time, value)
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+
+        # optional shared backing store, one table per cache so several caches can share a file
+        self.table = name
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute(f'CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, expires REAL, value TEXT)')
+            self.db.commit()
+
+    # return the cached value for key, or None if it's missing or expired
+    def get(self, key: str):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[key]
+
+            if self.db is not None:
+                row = self.db.execute(f'SELECT expires, value FROM {self.table} WHERE key = ?', (key,)).fetchone()
+                if row is not None and row[0] > now:
+                    value = json.loads(row[1])
+                    self.store(key, row[0], value)
+                    self.shared_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    # cache value under key for ttl seconds
+    def put(self, key: str, value):
+        expires = time.time() + self.ttl
+        with self.lock:
+            self.store(key, expires, value)
+            if self.db is not None:
+                self.db.execute(f'INSERT OR REPLACE INTO {self.table} (key, expires, value) VALUES (?, ?, ?)', (key, expires, json.dumps(value)))
+                # every PRUNE_INTERVAL writes, bring the shared table back within the same bound, dropping expired and then
+                # the soonest-to-expire entries
+                self.writes += 1
+                if self.writes % PRUNE_INTERVAL == 0:
+                    self.db.execute(f'DELETE FROM {self.table} WHERE expires <= ?', (time.time(),))
+                    self.db.execute(f'DELETE FROM {self.table} WHERE key NOT IN (SELECT key FROM {self.table} ORDER BY expires DESC LIMIT ?)', (self.max_entries,))
+                self.db.commit()
+
+    # add an entry to the in-memory LRU, evicting the least recently used entries past max_entries
+    # note: caller holds the lock
+    def store(self, key: str, expires: float, value):
+        self.entries[key] = (expires, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    # return the cached value for key, computing and caching it with compute() on a miss
+    def get_or_compute(self, key: str, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    # hit/miss counters and current size
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "shared": self.db is not None,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else None,
+            }
+
+# search nodes a cache miss is given to solve outright before canonicalizing it: most grids are solved in fewer nodes than
+# canonical_form takes to run, so only the grids that outlast this are worth looking up by their canonical form
+CANONICAL_AFTER_NODES = 8
+
+# solve a grid through a cache that also matches isomorphs (see solver.canonical_form): relabeled, transposed, or with rows,
+# columns, bands, or stacks swapped. the grid's own key is looked up first, and a miss is solved outright within
+# CANONICAL_AFTER_NODES search nodes. only a grid that outlasts that is canonicalized and looked up by its canonical form,
+# so every isomorph of a hard puzzle that was already solved is answered without searching
+# solve(grid, max_nodes) returns {"solution": ..., "is_unique": ...} for a grid, raising solver.SearchAborted once it has
+# searched max_nodes nodes (None for the caller's own budget). a canonical solution is mapped back to the grid's own
+# coordinates, and results are stored under the grid's own key as well. prefix separates results that shouldn't be shared
+# (e.g. engines)
+def get_or_solve_canonical(cache: ResultCache, grid: list, solve, prefix: str = ''):
+    key = prefix + grid_key(grid)
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    try:
+        result = solve(grid, CANONICAL_AFTER_NODES)
+    except SearchAborted:
+        canonical, transform = canonical_form(grid)
+        canonical_key = prefix + grid_key(canonical)
+        # case: no other grid shares this one's canonical form (e.g. a board other than 9 x 9)
+        if canonical_key == key:
+            result = solve(grid, None)
+        else:
+            canonical_result = cache.get_or_compute(canonical_key, lambda: solve(canonical, None))
+            solution = canonical_result["solution"]
+            result = {
+                "solution": None if solution is None else invert_transform(solution, transform),
+                "is_unique": canonical_result["is_unique"],
+            }
+    cache.put(key, result)
+    return result
@@ -1,280 +1,716 @@
 import math
-import copy
 import random
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-# check that no two elements in a row are the same
-def check_row(board: list, assigned: dict, row_index: int):
-    # create a set for the values that have been seen within the row
-    seen = set()
+import dlx
 
-    # iterate over each element in a row
-    for col_index, elem in enumerate(board[row_index]):
-        if elem in seen and elem != -1:
-            return False
-        
-        # if the (row, col) element was initially unassigned, then check "assigned" for updated values
-        if elem == -1 and (row_index, col_index) in assigned:
-            if assigned[(row_index, col_index)] in seen:
+# bitmask constraint engine: cells are numbered in row-major order (0-80 on a 9 x 9 board) and value v is stored as the bit 1 << (v - 1)
+
+# box widths the engine supports, i.e. 4 x 4, 9 x 9, 16 x 16, and 25 x 25 boards
+BOX_SIZES = (2, 3, 4, 5)
+BOARD_SIZES = tuple(box * box for box in BOX_SIZES)
+
+# boards up to this size get the bit count and values of every mask precomputed (2 ** size entries); wider masks are
+# worked out when they're looked up
+MAX_TABULATED_SIZE = 16
+
+# bit count of a mask, looked up like BIT_COUNT
+class BitCounts:
+    def __getitem__(self, mask: int):
+        return mask.bit_count()
+
+# values a mask contains in ascending order, looked up like MASK_VALUES
+class MaskValues:
+    def __getitem__(self, mask: int):
+        values = []
+        while mask:
+            bit = mask & -mask
+            values.append(bit.bit_length())
+            mask ^= bit
+        return values
+
+# geometry of a board made of box x box grids: size values, rows, columns, and grids, and size * size cells
+# holds the lookup tables the engine uses so the search never has to recompute them, built once per box width (see get_layout)
+class Layout:
+    def __init__(self, box: int):
+        size = box * box
+        num_cells = size * size
+        self.box = box
+        self.size = size
+        self.num_cells = num_cells
+        self.all_values = (1 << size) - 1
+
+        # the row, column, and grid of every cell
+        self.cell_row = [cell // size for cell in range(num_cells)]
+        self.cell_col = [cell % size for cell in range(num_cells)]
+        self.cell_grid = [(cell // (size * box)) * box + (cell % size) // box for cell in range(num_cells)]
+
+        # the cells that share a row, column, or grid with each cell (20 on a 9 x 9 board)
+        self.peers = [[peer for peer in range(num_cells) if peer != cell and (self.cell_row[peer] == self.cell_row[cell] or self.cell_col[peer] == self.cell_col[cell] or self.cell_grid[peer] == self.cell_grid[cell])] for cell in range(num_cells)]
+
+        # the 3 * size units (rows, then columns, then grids) as lists of cells
+        self.units = [[cell for cell in range(num_cells) if self.cell_row[cell] == index] for index in range(size)] + \
+                     [[cell for cell in range(num_cells) if self.cell_col[cell] == index] for index in range(size)] + \
+                     [[cell for cell in range(num_cells) if self.cell_grid[cell] == index] for index in range(size)]
+
+        # every intersection of a grid with a row or column, as (cells in both, rest of the line, rest of the grid)
+        self.intersections = []
+        for grid_index in range(size):
+            grid = set(self.units[2 * size + grid_index])
+            for line_index in range(2 * size):
+                line = set(self.units[line_index])
+                if grid & line:
+                    self.intersections.append((
+                        [cell for cell in self.units[2 * size + grid_index] if cell in line],
+                        [cell for cell in self.units[line_index] if cell not in grid],
+                        [cell for cell in self.units[2 * size + grid_index] if cell not in line],
+                    ))
+
+        # number of candidates in each mask, and the values a mask contains in ascending order
+        if size <= MAX_TABULATED_SIZE:
+            self.bit_count = [bin(mask).count('1') for mask in range(self.all_values + 1)]
+            self.mask_values = [[value for value in range(1, size + 1) if mask & (1 << (value - 1))] for mask in range(self.all_values + 1)]
+        else:
+            self.bit_count = BitCounts()
+            self.mask_values = MaskValues()
+
+        # along one search path each (cell, value) candidate is removed at most once and each cell is assigned at most once,
+        # so the trail never holds more than num_cells * (size - 1) removals + num_cells assignments
+        self.trail_size = num_cells * size
+
+# layouts built so far, by board size
+LAYOUTS = {}
+
+# the layout of size x size boards, raises ValueError for a size the engine doesn't support (see BOARD_SIZES)
+def get_layout(size: int):
+    layout = LAYOUTS.get(size)
+    if layout is None:
+        if size not in BOARD_SIZES:
+            raise ValueError(f"unsupported board size {size}, expected one of {BOARD_SIZES}")
+        layout = LAYOUTS[size] = Layout(math.isqrt(size))
+    return layout
+
+# the standard 9 x 9 layout, whose tables are also available under their own names
+STANDARD_LAYOUT = get_layout(9)
+ALL_VALUES = STANDARD_LAYOUT.all_values
+CELL_ROW = STANDARD_LAYOUT.cell_row
+CELL_COL = STANDARD_LAYOUT.cell_col
+CELL_GRID = STANDARD_LAYOUT.cell_grid
+PEERS = STANDARD_LAYOUT.peers
+UNITS = STANDARD_LAYOUT.units
+INTERSECTIONS = STANDARD_LAYOUT.intersections
+BIT_COUNT = STANDARD_LAYOUT.bit_count
+MASK_VALUES = STANDARD_LAYOUT.mask_values
+TRAIL_SIZE = STANDARD_LAYOUT.trail_size
+
+# trail entries are (cell, old candidate mask) pairs, or (cell, ASSIGNED) for a cell that was filled in
+ASSIGNED = -1
+
+# search state: the values of all cells (-1 if empty), the used-value masks of each row, column, and grid,
+# the candidate mask of each empty cell, the cells that started out empty, and how many of them are still unfilled
+# assignments and candidate removals are recorded on a preallocated undo trail, so backtracking restores
+# the state by popping the trail instead of copying it
+class SearchState:
+    def __init__(self, layout: Layout = STANDARD_LAYOUT):
+        self.layout = layout
+        self.cells = [-1] * layout.num_cells
+        self.rows = [0] * layout.size
+        self.cols = [0] * layout.size
+        self.grids = [0] * layout.size
+        self.cands = [0] * layout.num_cells
+        self.empties = []
+        self.unfilled = 0
+        self.trail = [0] * (2 * layout.trail_size)
+        self.trail_top = 0
+
+# build the search state for a board of any supported size, returns None if two givens share a row, column, or grid
+def build_state(board: list, to_assign: dict):
+    layout = get_layout(len(board))
+    state = SearchState(layout)
+    for row_index in range(layout.size):
+        for col_index in range(layout.size):
+            elem = board[row_index][col_index]
+            cell = row_index * layout.size + col_index
+
+            # case: empty cell, or a cell the caller asked to fill
+            if elem == -1 or (row_index, col_index) in to_assign:
+                state.empties.append(cell)
+                continue
+
+            bit = 1 << (elem - 1)
+            grid_index = layout.cell_grid[cell]
+            if (state.rows[row_index] | state.cols[col_index] | state.grids[grid_index]) & bit:
+                return None
+            state.rows[row_index] |= bit
+            state.cols[col_index] |= bit
+            state.grids[grid_index] |= bit
+            state.cells[cell] = elem
+
+    # the initial domain of each empty cell is every value not yet used in its row, column, or grid
+    for cell in state.empties:
+        state.cands[cell] = layout.all_values & ~(state.rows[layout.cell_row[cell]] | state.cols[layout.cell_col[cell]] | state.grids[layout.cell_grid[cell]])
+    state.unfilled = len(state.empties)
+    return state
+
+# used-value mask of a unit, indexed like Layout.units
+def unit_mask(state: SearchState, unit_index: int):
+    size = state.layout.size
+    if unit_index < size:
+        return state.rows[unit_index]
+    if unit_index < 2 * size:
+        return state.cols[unit_index - size]
+    return state.grids[unit_index - 2 * size]
+
+# assign value to cell and forward-check: remove the value from the domain of every empty peer, recording each change on the trail
+# returns False if a peer's domain is left empty (the caller still has to undo back to its trail mark)
+def assign(state: SearchState, cell: int, value: int):
+    bit = 1 << (value - 1)
+    layout = state.layout
+    cells = state.cells
+    cands = state.cands
+    trail = state.trail
+    top = state.trail_top
+
+    trail[top] = cell
+    trail[top + 1] = ASSIGNED
+    top += 2
+    cells[cell] = value
+    state.unfilled -= 1
+    state.rows[layout.cell_row[cell]] |= bit
+    state.cols[layout.cell_col[cell]] |= bit
+    state.grids[layout.cell_grid[cell]] |= bit
+
+    for peer in layout.peers[cell]:
+        mask = cands[peer]
+        if mask & bit and cells[peer] == -1:
+            trail[top] = peer
+            trail[top + 1] = mask
+            top += 2
+            mask ^= bit
+            cands[peer] = mask
+            # case: domain wipeout
+            if not mask:
+                state.trail_top = top
                 return False
-            else:
-                seen.add(assigned[(row_index, col_index)])
-        if (elem != -1):
-            seen.add(elem)
+    state.trail_top = top
     return True
 
-# check that no two elements in a column are the same
-def check_col(board: list, assigned: dict, col_index: int):
-    seen = set()
+# remove the values in bits from the domain of an empty cell, recording the change on the trail
+# returns False if the domain is left empty
+def eliminate(state: SearchState, cell: int, bits: int):
+    mask = state.cands[cell]
+    state.trail[state.trail_top] = cell
+    state.trail[state.trail_top + 1] = mask
+    state.trail_top += 2
+    mask &= ~bits
+    state.cands[cell] = mask
+    return mask != 0
 
-    # iterate over column by visiting each row[col_index] value
-    for row_index, row in enumerate(board):
-        elem = row[col_index]
-        if elem in seen and elem != -1:
-            return False
-        
-        # if the (row, col) element was initially unassigned, then check "assigned" for updated values
-        if elem == -1 and (row_index, col_index) in assigned:
-            if assigned[(row_index, col_index)] in seen:
-                return False
+# pop the trail back to mark, restoring every domain and clearing every cell assigned since then
+def undo(state: SearchState, mark: int):
+    layout = state.layout
+    cells = state.cells
+    cands = state.cands
+    trail = state.trail
+    top = state.trail_top
+    while top > mark:
+        top -= 2
+        cell = trail[top]
+        mask = trail[top + 1]
+        if mask == ASSIGNED:
+            bit = 1 << (cells[cell] - 1)
+            state.rows[layout.cell_row[cell]] ^= bit
+            state.cols[layout.cell_col[cell]] ^= bit
+            state.grids[layout.cell_grid[cell]] ^= bit
+            cells[cell] = -1
+            state.unfilled += 1
+        else:
+            cands[cell] = mask
+    state.trail_top = mark
+
+# propagation rules: each takes the state and returns how many deductions it made, or CONTRADICTION if it found a dead end
+CONTRADICTION = -1
+
+# naked single: an empty cell with only one candidate must take that value
+def naked_singles(state: SearchState):
+    bit_count = state.layout.bit_count
+    cells = state.cells
+    cands = state.cands
+    found = 0
+    for cell in state.empties:
+        if cells[cell] != -1:
+            continue
+        mask = cands[cell]
+        if mask == 0:
+            return CONTRADICTION
+        if bit_count[mask] == 1:
+            if not assign(state, cell, (mask & -mask).bit_length()):
+                return CONTRADICTION
+            found += 1
+    return found
+
+# hidden single: a value that fits in only one empty cell of a unit must go in that cell
+def hidden_singles(state: SearchState):
+    layout = state.layout
+    cells = state.cells
+    cands = state.cands
+    found = 0
+    for unit_index, unit in enumerate(layout.units):
+        # once: values seen in at least one empty cell, twice: values seen in at least two
+        once = 0
+        twice = 0
+        for cell in unit:
+            if cells[cell] == -1:
+                twice |= once & cands[cell]
+                once |= cands[cell]
+
+        missing = layout.all_values & ~unit_mask(state, unit_index)
+        # case: a value still missing from the unit has nowhere to go
+        if missing & ~once:
+            return CONTRADICTION
+
+        singles = missing & once & ~twice
+        for value in layout.mask_values[singles]:
+            bit = 1 << (value - 1)
+            for cell in unit:
+                if cells[cell] == -1 and cands[cell] & bit:
+                    if not assign(state, cell, value):
+                        return CONTRADICTION
+                    found += 1
+                    break
             else:
-                seen.add(assigned[(row_index, col_index)])
-        if (elem != -1):
-            seen.add(elem)
+                # case: an earlier single in this unit took the only cell this value could go in
+                return CONTRADICTION
+    return found
 
-    return True
+# naked pairs/triples: if k empty cells of a unit share only k candidates between them, no other cell in the unit can take those values
+def naked_subsets(state: SearchState):
+    bit_count = state.layout.bit_count
+    cells = state.cells
+    cands = state.cands
+    found = 0
+    for unit in state.layout.units:
+        small = [cell for cell in unit if cells[cell] == -1 and 2 <= bit_count[cands[cell]] <= 3]
+        for size in (2, 3):
+            for group in itertools.combinations(small, size):
+                union = 0
+                for cell in group:
+                    union |= cands[cell]
+                if bit_count[union] != size:
+                    continue
+                for cell in unit:
+                    if cells[cell] == -1 and cell not in group and cands[cell] & union:
+                        if not eliminate(state, cell, union):
+                            return CONTRADICTION
+                        found += 1
+    return found
 
-# helper function for get_grid_indices, will return a (row, col) value for the start of the grid
-def get_grid_indices(board: list, grid_number: int):
-    # 3x3 grids numbered from 1-9, in row-major order
-    match grid_number:
-        case 0:
-            return 0, 0
-        case 1:
-            return 3, 0
-        case 2:
-            return 6, 0
-        case 3:
-            return 3, 0
-        case 4:
-            return 3, 3
-        case 5:
-            return 3, 6
-        case 6:
-            return 6, 0
-        case 7:
-            return 6, 3
-        case 8:
-            return 6, 6
-
-# check that no two elements in a grid are the same
-def check_grid(board: list, assigned: dict, grid_number: int):
-    seen = set()
-    # get the starting row and column values
-    start_row, start_col = get_grid_indices(board, grid_number)
-
-    # define curr row and curr col for iterating over 3x3 grid
-    curr_row = start_row
-    curr_col = start_col
-    while curr_row <= start_row + 2 and curr_col <= start_col + 2:
-        elem = board[curr_row][curr_col]
-        if elem in seen and elem != -1:
+# pointing / box-line reduction: if a value's candidates in a grid all lie on one row or column, it can't go elsewhere on that line,
+# and if a value's candidates on a line all lie in one grid, it can't go elsewhere in that grid
+def intersections(state: SearchState):
+    cells = state.cells
+    cands = state.cands
+    found = 0
+    for shared, line_rest, grid_rest in state.layout.intersections:
+        shared_mask = 0
+        for cell in shared:
+            if cells[cell] == -1:
+                shared_mask |= cands[cell]
+        if not shared_mask:
+            continue
+        line_mask = 0
+        for cell in line_rest:
+            if cells[cell] == -1:
+                line_mask |= cands[cell]
+        grid_mask = 0
+        for cell in grid_rest:
+            if cells[cell] == -1:
+                grid_mask |= cands[cell]
+
+        # (pointing) values confined to the line within the grid, (box-line) values confined to the grid within the line
+        for bits, targets in ((shared_mask & ~grid_mask & line_mask, line_rest), (shared_mask & ~line_mask & grid_mask, grid_rest)):
+            if not bits:
+                continue
+            for cell in targets:
+                if cells[cell] == -1 and cands[cell] & bits:
+                    if not eliminate(state, cell, bits):
+                        return CONTRADICTION
+                    found += 1
+    return found
+
+# every available propagation rule by name, in the order they are tried (cheapest first)
+PROPAGATION_RULES = {
+    'naked_singles': naked_singles,
+    'hidden_singles': hidden_singles,
+    'naked_subsets': naked_subsets,
+    'intersections': intersections,
+}
+DEFAULT_RULES = tuple(PROPAGATION_RULES)
+
+# raised by search when its budget runs out, so a runaway search can be abandoned
+class SearchAborted(Exception):
+    pass
+
+# how many nodes a budget lets pass between checks of the clock and the cancel flag
+BUDGET_CHECK_INTERVAL = 256
+
+# limits on a single search: wall-clock seconds, number of nodes, and a cancelled() callback (e.g. the client went away)
+# search calls spend() at every node and unwinds with SearchAborted once any limit is hit
+class SearchBudget:
+    def __init__(self, time_limit: float = None, max_nodes: int = None, cancelled=None):
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.max_nodes = max_nodes
+        self.cancelled = cancelled
+        self.nodes = 0
+
+    def spend(self):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SearchAborted('node budget exceeded')
+        # the clock and the callback are comparatively slow, so only look at them every few hundred nodes
+        if self.nodes % BUDGET_CHECK_INTERVAL == 0:
+            self.check()
+
+    # raise SearchAborted if the deadline has passed or the search was cancelled, without spending a node
+    def check(self):
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchAborted('time budget exceeded')
+        if self.cancelled is not None and self.cancelled():
+            raise SearchAborted('search cancelled')
+
+# run the rules until none of them can make another deduction, adding each rule's deductions to counters (if given)
+# after any rule makes progress we start over from the cheapest rule
+# returns False if the state is a dead end
+def propagate(state: SearchState, rules: list, counters: dict = None):
+    index = 0
+    while index < len(rules):
+        found = rules[index][1](state)
+        if found == CONTRADICTION:
             return False
-        
-        # if the (row, col) element was initially unassigned, then check "assigned" for updated values
-        if elem == -1 and (curr_row, curr_col) in assigned:
-            if assigned[(curr_row, curr_col)] in seen:
-                return False
-            else:
-                seen.add(assigned[(curr_row, curr_col)])
-        if (elem != -1):
-            seen.add(elem)
-
-        # at end of grid row, go to beginning of next column
-        if curr_row == start_row + 2:
-            curr_row = start_row
-            curr_col += 1
+        if found > 0:
+            if counters is not None:
+                counters[rules[index][0]] = counters.get(rules[index][0], 0) + found
+            index = 0
         else:
-            curr_row += 1
+            index += 1
     return True
 
-# check that the current board and the assigned values satisfy the all-diff constraints for each row, column, and grid
-def satisfies_constraints(board: list, assigned: dict):
-    row_index = 0
-    col_index = 0
-    grid_index = 0
-    while (row_index < 9):
-        if not check_row(board, assigned, row_index):
-            return False
-        row_index += 1
-    while (col_index < 9):
-        if not check_col(board, assigned, col_index):
-            return False
-        col_index += 1
+# depth-first search over the unfilled cells, picking the cell with the fewest candidates (MRV) at each step
+# every assignment is followed by propagation to a fixpoint; all changes go through the undo trail, so nothing is copied per node
+# appends each solution found to solutions and returns True once limit solutions have been found
+# rules is a list of propagation rule names (see PROPAGATION_RULES), counters collects how many deductions each rule made,
+# plus the search statistics listed in SEARCH_COUNTERS
+# budget (a SearchBudget) bounds the search, which raises SearchAborted once it runs out
+def search(state: SearchState, solutions: list, limit: int, randomize: bool = False, rules=DEFAULT_RULES, counters: dict = None, budget: SearchBudget = None):
+    size = state.layout.size
+    bit_count = state.layout.bit_count
+    mask_values = state.layout.mask_values
+    cells = state.cells
+    cands = state.cands
+    empties = state.empties
+    # after propagation with naked singles no cell is left with fewer than 2 candidates, so the first cell with 2 is already
+    # the one with the fewest and the scan for it can stop there instead of going over every other unfilled cell
+    good_enough = 2 if 'naked_singles' in rules else 1
+    rules = [(name, PROPAGATION_RULES[name]) for name in rules]
+    if counters is not None:
+        for name in SEARCH_COUNTERS:
+            counters.setdefault(name, 0.0 if name.endswith('_seconds') else 0)
+
+    # assign value to cell (skipped for cell -1) and propagate, timing it as constraint checking and counting the candidates
+    # it pruned, i.e. the trail entries it pushed that aren't assignments
+    # note: only used with counters, the uninstrumented search calls assign and propagate directly
+    def constrain(cell: int, value: int):
+        started = time.perf_counter()
+        mark = state.trail_top
+        unfilled = state.unfilled
+        consistent = (cell == -1 or assign(state, cell, value)) and propagate(state, rules, counters)
+        counters['prunings'] = counters.get('prunings', 0) + (state.trail_top - mark) // 2 - (unfilled - state.unfilled)
+        counters['check_seconds'] = counters.get('check_seconds', 0.0) + time.perf_counter() - started
+        return consistent
 
-    while (grid_index < 9):
-        if not check_grid(board, assigned, grid_index):
+    def recurse(depth: int):
+        if budget is not None:
+            budget.spend()
+        if counters is not None:
+            counters['nodes'] = counters.get('nodes', 0) + 1
+            if depth > counters.get('max_depth', 0):
+                counters['max_depth'] = depth
+
+        # case: every cell filled -> record the solution
+        if state.unfilled == 0:
+            solutions.append([cells[row_index * size:row_index * size + size] for row_index in range(size)])
+            return len(solutions) >= limit
+
+        # find the unfilled cell with the fewest candidates, stopping early at a forced or dead cell (or one that's as good)
+        best_cell = -1
+        best_count = size + 1
+        for cell in empties:
+            if cells[cell] != -1:
+                continue
+            count = bit_count[cands[cell]]
+            if count < best_count:
+                best_cell = cell
+                best_count = count
+                if count <= good_enough:
+                    break
+
+        # case: some cell has no candidates left -> backtrack
+        if best_count == 0:
             return False
-        grid_index += 1
 
-    return True
+        values = mask_values[cands[best_cell]]
+        if randomize:
+            values = values[:]
+            random.shuffle(values)
 
-# remove the value being assigned from domain of all (col, row) unassigned variables in the same row, column, or grid as the variable it is being assigned to
-def forward_checking(to_assign: dict, possible_value: str, row_index: int, col_index: int):
-    # iterate over all the unassigned variables
-    for elem in to_assign:
-            # calculate whether the element is in the same grid as the given element
-            same_grid = (math.floor(row_index / 3) * 3 == math.floor(elem[0] / 3) * 3) and (math.floor(col_index / 3) * 3 == math.floor(elem[1] / 3) * 3)
-            
-            # check if the element is is the same row, column, or grid
-            if (row_index == elem[0] or col_index == elem[1] or same_grid):
-                    # check if the element has the possible value in the domain
-                    if possible_value in to_assign[elem]:
-                            # if it's the last value in the domain, then there must be a mistake, so return False to signal backtracking!
-                            if (len(to_assign[elem]) == 1):
-                                    return False
-                            # otherwise, remove the value from the domain
-                            else:
-                                    to_assign[elem].remove(possible_value)
-
-    # if none of the domains are left empty, then return True
-    return True
+        # count guesses (cells with more than one candidate) and dead ends, which measure how much search a puzzle needs
+        if counters is not None and best_count > 1:
+            counters['branches'] = counters.get('branches', 0) + 1
 
-# recursive helper function for solve
-def recursive_backtracking(board: list, to_assign: dict, solutions: list, assigned: dict):
-    # if assignment complete, then return assignment
-    if (len(to_assign) == 0 and satisfies_constraints(board, assigned)):
-        # add each assignment from assigned to the board and return the completed board
-        for elem in assigned:
-            board[elem[0]][elem[1]] = assigned[elem]
+        for value in values:
+            mark = state.trail_top
+            if (assign(state, best_cell, value) and propagate(state, rules)) if counters is None else constrain(best_cell, value):
+                if recurse(depth + 1):
+                    undo(state, mark)
+                    return True
+            elif counters is not None:
+                counters['backtracks'] = counters.get('backtracks', 0) + 1
+            undo(state, mark)
+        return False
+
+    # propagate the givens before branching, then leave the state as it was found (even if the budget ran out)
+    mark = state.trail_top
+    started = time.perf_counter()
+    check_seconds = counters.get('check_seconds', 0.0) if counters is not None else 0.0
+    try:
+        done = (propagate(state, rules) if counters is None else constrain(-1, 0)) and recurse(0)
+    finally:
+        undo(state, mark)
+        # the rest of the time went to picking cells, branching, and undoing
+        if counters is not None:
+            elapsed = time.perf_counter() - started
+            counters['search_seconds'] = counters.get('search_seconds', 0.0) + elapsed - (counters.get('check_seconds', 0.0) - check_seconds)
+    return done
+
+# search statistics that search() adds to counters, next to the deductions of each propagation rule:
+#   nodes:          search nodes visited (the root and every consistent assignment)
+#   branches:       nodes that had to guess between several candidates
+#   backtracks:     guesses that failed right away
+#   prunings:       candidates removed by forward checking and propagation
+#   max_depth:      deepest node reached
+#   check_seconds:  time spent assigning and propagating (constraint checks)
+#   search_seconds: the rest of the search: picking cells, branching, and undoing
+SEARCH_COUNTERS = ('nodes', 'branches', 'backtracks', 'prunings', 'max_depth', 'check_seconds', 'search_seconds')
+
+# techniques a hint can come from, cheapest first: a single in the current candidates, a single that appears after
+# eliminations by one of the subset or intersection rules, or, when the puzzle needs guessing, a cell read off the solution
+HINT_TECHNIQUES = ('naked_single', 'hidden_single', 'naked_subsets', 'intersections', 'search')
+
+# find one naked or hidden single without assigning it, returns (cell, value, technique), None if there is no single,
+# or CONTRADICTION if some cell or value has no place left
+def find_single(state: SearchState):
+    layout = state.layout
+    cells = state.cells
+    cands = state.cands
+    for cell in state.empties:
+        if cells[cell] != -1:
+            continue
+        mask = cands[cell]
+        if mask == 0:
+            return CONTRADICTION
+        if layout.bit_count[mask] == 1:
+            return cell, mask.bit_length(), 'naked_single'
+
+    for unit_index, unit in enumerate(layout.units):
+        once = 0
+        twice = 0
+        for cell in unit:
+            if cells[cell] == -1:
+                twice |= once & cands[cell]
+                once |= cands[cell]
+
+        missing = layout.all_values & ~unit_mask(state, unit_index)
+        if missing & ~once:
+            return CONTRADICTION
 
-        current_solution = copy.deepcopy(board)
+        singles = missing & once & ~twice
+        if singles:
+            bit = singles & -singles
+            for cell in unit:
+                if cells[cell] == -1 and cands[cell] & bit:
+                    return cell, bit.bit_length(), 'hidden_single'
+    return None
 
-        # case: this is the first solution -> continue to see if there's another distinct one
-        if len(solutions) == 0:
-            solutions.append(current_solution)
-            return True
+# the cheapest next deduction for a state, returns (cell, value, technique) or None if the state has no solution (or no empty cell)
+# the technique is the hardest one the hint needed (see HINT_TECHNIQUES). eliminations made along the way stay applied to the
+# state, which is only ever narrowed by sound deductions, so it can be kept and reused for the next hint
+# budget (a SearchBudget) bounds the search needed when no deduction is left, which is skipped if the solution is already known
+def find_hint(state: SearchState, budget: SearchBudget = None, solution: list = None):
+    if state.unfilled == 0:
+        return None
 
-        # case:  already seen this exact solution → it's unique
-        if current_solution == solutions[0]:
-            return True
+    hardest = 0
+    eliminations = [(name, PROPAGATION_RULES[name]) for name in ('naked_subsets', 'intersections')]
+    while True:
+        single = find_single(state)
+        if single == CONTRADICTION:
+            return None
+        if single is not None:
+            cell, value, technique = single
+            return cell, value, HINT_TECHNIQUES[max(hardest, HINT_TECHNIQUES.index(technique))]
 
-        # case: solution is different → not unique
-        solutions.append(current_solution)
+        # no single yet -> run the elimination rules, cheapest first, until one of them makes progress
+        for name, rule in eliminations:
+            found = rule(state)
+            if found == CONTRADICTION:
+                return None
+            if found > 0:
+                hardest = max(hardest, HINT_TECHNIQUES.index(name))
+                break
+        else:
+            break
+
+    # case: stuck without guessing -> solve, and reveal the cell with the fewest candidates
+    if solution is None:
+        solutions = []
+        search(state, solutions, 1, budget=budget)
+        if not solutions:
+            return None
+        solution = solutions[0]
+    cell = min((cell for cell in state.empties if state.cells[cell] == -1), key=lambda cell: state.layout.bit_count[state.cands[cell]])
+    row_index, col_index = divmod(cell, state.layout.size)
+    return cell, solution[row_index][col_index], 'search'
+
+# bring a state up to date with a grid that only fills in more of its empty cells (e.g. the player placed a hint), assigning
+# each new value. returns False, leaving the state as it was, if the grid clears or changes a cell, is a different size, or a
+# new value contradicts the state; the caller should then build a fresh state
+def sync_state(state: SearchState, grid: list):
+    size = state.layout.size
+    if len(grid) != size:
         return False
-    
-    # sort the dictionary by domain size and get the variable with the smallest domain
-    # note: elem is of the form ((row, col), ['possible_value1', 'possible_value2', etc])
-    elem = sorted(to_assign.items(), key=lambda x: len(x[1]))[0]
-
-    var = elem[0] # row, col
-    values = elem[1][:] # domain list
-    random.shuffle(values)
-
-    # try each possible value in the element's domain until one works
-    for possible_value in values:
-        # make a copy of the variables and domains in to_assign, in case backtracking is triggered
-        to_assign_copy = copy.deepcopy(to_assign)
-
-        # add the assignment to assigned, remove the variable from to_assign
-        assigned[var] = possible_value
-        to_assign.pop(var)
-
-        # if the assignment satisfies the constraints, and forward-checking doesn't leave any domains empty, recurse to next variable
-        if satisfies_constraints(board, assigned) and forward_checking(to_assign, possible_value, var[0], var[1]):
-            continue_search = recursive_backtracking(board, to_assign, solutions, assigned)
-            # early exit
-            if not continue_search:
-                    return False
-                
-        # otherwise, backtrack by removing the assignment from assigned and restoring the to_assign
-        assigned.pop(var)
-        to_assign = to_assign_copy
-
-    # case: no solution
+    mark = state.trail_top
+    for cell in range(state.layout.num_cells):
+        value = grid[cell // size][cell % size]
+        if value == state.cells[cell]:
+            continue
+        if value == -1 or state.cells[cell] != -1 or not state.cands[cell] & (1 << (value - 1)) or not assign(state, cell, value):
+            undo(state, mark)
+            return False
     return True
-        
-# the main algorithm for solving the sudoku puzzle
-def solve(board: list, to_assign: dict):
-    assigned = {}
-    # get the initial variables to assign with the calculated domains
-    to_assign = calculate_initial_domains(board, to_assign)
-    solutions = []
 
-    # recursively backtrack until an answer is found
-    is_unique = recursive_backtracking(board, to_assign, solutions, assigned)
+# solver engines that solve() and generate_board() can use:
+#   csp: backtracking search with the propagation rules above
+#   dlx: exact cover with dancing links (see dlx.py)
+ENGINES = ('csp', 'dlx')
+
+# the main algorithm for solving the sudoku puzzle, on a board of any supported size (see BOARD_SIZES)
+# note: to_assign is kept for compatibility with existing callers - its keys are the cells to fill, domains are recomputed
+# rules picks which propagation rules run after every assignment, and counters (if given) collects how many deductions each made
+# and the search statistics listed in SEARCH_COUNTERS (csp engine only)
+# budget (a SearchBudget) makes the search raise SearchAborted instead of running past a time or node limit
+def solve(board: list, to_assign: dict, randomize: bool = False, rules=DEFAULT_RULES, counters: dict = None, engine: str = 'csp', budget: SearchBudget = None):
+    if engine == 'csp':
+        state = build_state(board, to_assign)
+
+        # case: the givens already break a row, column, or grid constraint
+        if state is None:
+            return None, False
+
+        # search for up to 2 solutions, stopping early once a second distinct one is found
+        solutions = []
+        search(state, solutions, 2, randomize, rules, counters, budget)
+    elif engine == 'dlx':
+        givens = [[-1 if (row_index, col_index) in to_assign else elem for col_index, elem in enumerate(row)] for row_index, row in enumerate(board)]
+        solutions = dlx.find_solutions(givens, 2, randomize, budget)
+    else:
+        raise ValueError(f"unknown solver engine '{engine}', expected one of {ENGINES}")
 
     if len(solutions) == 0:
         return None, False  # no solution at all
-    if is_unique:
+    if len(solutions) == 1:
         return solutions[0], True  # unique solution
     else:
         return solutions[0], False  # multiple solutions
 
-# initialize the domains of the unassigned variables in to_assign
-def calculate_initial_domains(board: list, to_assign: dict):
-    # iterate over to_assign and calculate each domain
-    for elem in to_assign:
-            to_assign[elem] = calculate_domain(board, elem[0], elem[1])
-
-    # order so that the elements with the smallest domain appear first
-    return dict(sorted(to_assign.items(), key=lambda x: len(x[1])))
-
-# calculate the domain of a (row, col) variable based on the other values in the row/col/grid
-# NOTE: this function is only used before any assignments are made, so I did not bother to consider values that have been assigned when calculating domain
-def calculate_domain(board: list, row_index: int, col_index: int):
-    # start with all possible values 1-9 in domain
-    domain = [1, 2, 3, 4, 5, 6, 7, 8, 9]
-
-    # iterate over the given row and remove the values of the other elements in the row
-    for curr_col, elem in enumerate(board[row_index]):
-        if elem in domain and elem != -1:
-            domain.remove(elem)
-
-    # iterate over the given column and remove the values of the other elements in the column
-    for curr_row, elem in enumerate(board):
-        if elem[col_index] in domain and elem[col_index] != -1:
-            domain.remove(elem[col_index])
-
-    # iterate over the given grid and remove the values of the other elements in the grid
-    grid_row_start = (math.floor(row_index / 3) * 3)
-    grid_col_start = (math.floor(col_index / 3) * 3)
-    curr_row = grid_row_start 
-    curr_col = grid_col_start
-    
-    while curr_row <= grid_row_start + 2 and curr_col <= grid_col_start + 2:
-        elem = board[curr_row][curr_col]
-        if elem in domain and elem != -1:
-            domain.remove(elem)
-        # if reached end of grid row, move to next col
-        if curr_row == grid_row_start + 2:
-            curr_row = grid_row_start
-            curr_col += 1
-        else:
-            curr_row += 1
-    return domain
+# count the solutions of a search state, stopping as soon as limit have been found
+# the state is left exactly as it was, so it can be changed (see remove_given) and counted again
+# budget (a SearchBudget) bounds the search, which raises SearchAborted once it runs out
+def count_state_solutions(state: SearchState, limit: int = 2, budget: SearchBudget = None):
+    solutions = []
+    search(state, solutions, limit, budget=budget)
+    return len(solutions)
 
-def generate_board():
-    # create empty 9 x 9 board
-    board = [[-1 for _ in range(9)] for _ in range(9)]
+# count the solutions of a board (-1 for empty cells), stopping as soon as limit have been found
+# limit=2 is the uniqueness check: 0 means no solution, 1 a unique solution, and 2 more than one
+def count_solutions(board: list, limit: int = 2, engine: str = 'csp'):
+    if engine == 'dlx':
+        return dlx.count_solutions(board, limit)
+    if engine != 'csp':
+        raise ValueError(f"unknown solver engine '{engine}', expected one of {ENGINES}")
 
-    # populate to_assign
-    to_assign = {}
-    for row_index, row in enumerate(board):
-        for col_index, elem in enumerate(row):
-            to_assign[(row_index, col_index)] = [1, 2, 3, 4, 5, 6, 7, 8, 9]
-        
-    assigned = {}
+    state = build_state(board, {})
+    # case: the givens already break a row, column, or grid constraint
+    if state is None:
+        return 0
+    return count_state_solutions(state, limit)
 
-    solutions = []
-    new_board, is_unique = solve(board, to_assign)
+# recompute the domains of the empty peers of cell from the used-value masks
+# note: only valid between searches, when no propagation deductions are applied to the state
+def refresh_peer_domains(state: SearchState, cell: int):
+    layout = state.layout
+    for peer in layout.peers[cell]:
+        if state.cells[peer] == -1:
+            state.cands[peer] = layout.all_values & ~(state.rows[layout.cell_row[peer]] | state.cols[layout.cell_col[peer]] | state.grids[layout.cell_grid[peer]])
+
+# turn a given of a state into an empty cell, updating the used-value masks and the affected domains
+def remove_given(state: SearchState, cell: int):
+    layout = state.layout
+    bit = 1 << (state.cells[cell] - 1)
+    state.rows[layout.cell_row[cell]] ^= bit
+    state.cols[layout.cell_col[cell]] ^= bit
+    state.grids[layout.cell_grid[cell]] ^= bit
+    state.cells[cell] = -1
+    state.empties.append(cell)
+    state.unfilled += 1
+    state.cands[cell] = layout.all_values & ~(state.rows[layout.cell_row[cell]] | state.cols[layout.cell_col[cell]] | state.grids[layout.cell_grid[cell]])
+    refresh_peer_domains(state, cell)
+
+# inverse of remove_given: make an empty cell of a state a given again
+def restore_given(state: SearchState, cell: int, value: int):
+    layout = state.layout
+    bit = 1 << (value - 1)
+    state.rows[layout.cell_row[cell]] |= bit
+    state.cols[layout.cell_col[cell]] |= bit
+    state.grids[layout.cell_grid[cell]] |= bit
+    state.cells[cell] = value
+    state.empties.remove(cell)
+    state.unfilled -= 1
+    refresh_peer_domains(state, cell)
+
+# engine picks the solver used for filling the board and for the uniqueness checks (see ENGINES)
+# box is the width of a grid, so the board is box * box cells on a side (see BOX_SIZES)
+def generate_board(engine: str = 'csp', box: int = 3):
+    size = box * box
+    get_layout(size)
+
+    # fill an empty size x size board with a random solution
+    board = [[-1 for _ in range(size)] for _ in range(size)]
+    new_board, _ = solve(board, {}, randomize=True, engine=engine)
 
-    number_to_remove = random.randint(30, 60)
+    # keep one search state for the whole dig, removing givens from it in place instead of rebuilding it for every check
+    state = build_state(new_board, {}) if engine == 'csp' else None
+
+    # 30-60 cells on a 9 x 9 board, the same share of the cells on other sizes
+    number_to_remove = random.randint(30 * size * size // 81, 60 * size * size // 81)
     removed = 0
 
     while (removed < number_to_remove):
         # pick a random filled cell
-        row = random.randint(0, 8)
-        col = random.randint(0, 8)
+        row = random.randint(0, size - 1)
+        col = random.randint(0, size - 1)
 
         # case: picked cell is already empty, so skip
         if new_board[row][col] == -1:
@@ -285,12 +721,12 @@ def generate_board():
         # set to -1 to remove the value
         new_board[row][col] = -1
 
-        # prepare test board and to_assign for uniqueness check
-        test_board = copy.deepcopy(new_board)
-        test_to_assign = {(r, c): [] for r in range(9) for c in range(9) if test_board[r][c] == -1}
-        test_to_assign = calculate_initial_domains(test_board, test_to_assign)
-
-        _, still_unique = solve(test_board, test_to_assign)
+        # check that the board still has exactly one solution, stopping the search at the second
+        if state is not None:
+            remove_given(state, row * size + col)
+            still_unique = count_state_solutions(state, 2) == 1
+        else:
+            still_unique = count_solutions(new_board, 2, engine) == 1
 
         if still_unique:
             # removal successful
@@ -301,3 +737,436 @@ def generate_board():
             break
 
     return new_board
+
+# difficulty levels, from a puzzle that falls to singles alone to one that needs a lot of trial and error
+DIFFICULTIES = ('easy', 'medium', 'hard', 'expert')
+
+# difficulties a board of each size can be generated at: a 4 x 4 board is so small that every puzzle with a unique solution
+# falls to singles, so it can only be easy. sizes that aren't listed can reach every one of DIFFICULTIES
+SIZE_DIFFICULTIES = {4: ('easy',)}
+
+# the rules a human solver is expected to know at each level without guessing
+SINGLES_RULES = ('naked_singles', 'hidden_singles')
+
+# puzzles that need guessing are hard up to this many dead ends, expert beyond it
+HARD_MAX_BACKTRACKS = 2
+
+# check whether propagation with the given rules alone fills every cell of a state, leaving the state unchanged
+# a puzzle solved this way has exactly one solution, so this doubles as a cheap uniqueness check
+# budget (a SearchBudget) is checked once up front, raising SearchAborted if it already ran out
+def solvable_by(state: SearchState, rules: tuple, budget: SearchBudget = None):
+    if budget is not None:
+        budget.check()
+    mark = state.trail_top
+    solved = propagate(state, [(name, PROPAGATION_RULES[name]) for name in rules]) and state.unfilled == 0
+    undo(state, mark)
+    return solved
+
+# rate a puzzle by how much solver effort it takes, returns None if it doesn't have exactly one solution
+# otherwise returns {"difficulty": one of DIFFICULTIES, "score": ..., "counters": ...}, where counters are the deductions of each
+# propagation rule plus branches and backtracks of a full solve, and score weighs them into one number for finer comparisons
+# budget (a SearchBudget) bounds the solve, which raises SearchAborted once it runs out
+def rate_puzzle(board: list, budget: SearchBudget = None):
+    state = build_state(board, {})
+    if state is None:
+        return None
+
+    counters = {}
+    solutions = []
+    search(state, solutions, 2, counters=counters, budget=budget)
+    if len(solutions) != 1:
+        return None
+
+    if solvable_by(state, SINGLES_RULES):
+        difficulty = 'easy'
+    elif solvable_by(state, DEFAULT_RULES):
+        difficulty = 'medium'
+    elif counters.get('backtracks', 0) <= HARD_MAX_BACKTRACKS:
+        difficulty = 'hard'
+    else:
+        difficulty = 'expert'
+
+    score = counters.get('hidden_singles', 0) + 5 * (counters.get('naked_subsets', 0) + counters.get('intersections', 0)) \
+        + 20 * counters.get('branches', 0) + 50 * counters.get('backtracks', 0)
+    return {"difficulty": difficulty, "score": score, "counters": counters}
+
+# the cells of a board grouped into removal steps: pairs of cells that mirror each other through the center (180-degree
+# symmetry, the center cell on its own on odd sizes) if symmetric, otherwise single cells
+def removal_groups(symmetric: bool, num_cells: int = 81):
+    if not symmetric:
+        return [(cell,) for cell in range(num_cells)]
+    last = num_cells - 1
+    return [(cell, last - cell) if cell != last - cell else (cell,) for cell in range((num_cells + 1) // 2)]
+
+# dig holes in a full board, trying every removal group in random order and keeping each removal that passes keep(state)
+# a removal that fails is undone and digging moves on to the next group instead of stopping
+# returns (puzzle, finished): if keep raises SearchAborted, the group it was checking is put back and digging stops there,
+# with finished False. every removal in the puzzle has still passed keep
+def dig(board: list, symmetric: bool, keep):
+    state = build_state(board, {})
+    size = state.layout.size
+    groups = removal_groups(symmetric, state.layout.num_cells)
+    random.shuffle(groups)
+    finished = True
+    for group in groups:
+        values = [state.cells[cell] for cell in group]
+        for cell in group:
+            remove_given(state, cell)
+        try:
+            kept = keep(state)
+        except SearchAborted:
+            kept = finished = False
+        if not kept:
+            for cell, value in zip(group, values):
+                restore_given(state, cell, value)
+        if not finished:
+            break
+    return [state.cells[row_index * size:row_index * size + size] for row_index in range(size)], finished
+
+# generate a puzzle of the target difficulty (one of DIFFICULTIES) within time_budget seconds
+# each attempt fills a random board and digs it with a rule that keeps the puzzle within reach of the target:
+#   easy: every removal must leave the puzzle solvable by singles
+#   medium: every removal must leave it solvable by propagation without guessing
+#   hard, expert: every removal must keep the solution unique
+# the dug puzzle is then rated and returned if it lands on the target; otherwise we try again with a new board
+# every fill, uniqueness check, and rating shares one SearchBudget, so the whole call stops once time_budget runs out
+# returns (board, rating) - if the budget runs out, the attempt rated closest to the target, or else the part of the
+# interrupted dig that was done, with None for its rating ((None, None) if strict, or if not even a board was filled)
+# box is the width of a grid, as in generate_board
+def generate_puzzle(difficulty: str, time_budget: float = 2.0, symmetric: bool = True, strict: bool = False, box: int = 3):
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f"unknown difficulty '{difficulty}', expected one of {DIFFICULTIES}")
+    size = box * box
+    get_layout(size)
+    if difficulty not in SIZE_DIFFICULTIES.get(size, DIFFICULTIES):
+        raise ValueError(f"a {size} x {size} board can't be generated at difficulty '{difficulty}', expected one of {SIZE_DIFFICULTIES[size]}")
+
+    budget = SearchBudget(time_budget)
+    if difficulty == 'easy':
+        keep = lambda state: solvable_by(state, SINGLES_RULES, budget)
+    elif difficulty == 'medium':
+        keep = lambda state: solvable_by(state, DEFAULT_RULES, budget)
+    else:
+        keep = lambda state: count_state_solutions(state, 2, budget) == 1
+
+    target = DIFFICULTIES.index(difficulty)
+    # (distance from the target, board, rating) of the best attempt so far, an unrated board counting as furthest away
+    best = None
+    while True:
+        try:
+            full, _ = solve([[-1] * size for _ in range(size)], {}, randomize=True, budget=budget)
+        except SearchAborted:
+            break
+        board, finished = dig(full, symmetric, keep)
+        try:
+            rating = rate_puzzle(board, budget) if finished else None
+        except SearchAborted:
+            rating = None
+        if rating is None:
+            if best is None:
+                best = (len(DIFFICULTIES), board, None)
+            break
+        if rating['difficulty'] == difficulty:
+            return board, rating
+
+        distance = abs(DIFFICULTIES.index(rating['difficulty']) - target)
+        if best is None or distance < best[0]:
+            best = (distance, board, rating)
+        if time.perf_counter() >= budget.deadline:
+            break
+    return (None, None) if strict or best is None else (best[1], best[2])
+
+# batch statuses: a single solution, more than one solution, no solution, a grid that isn't a board of -1 and 1-9
+# (1-size on other board sizes), or whose givens already conflict, or a search that ran out of its budget
+BATCH_STATUSES = ('unique', 'multiple', 'none', 'invalid', 'aborted')
+
+# check that grid is a size x size list of ints in -1, 1-size, for one of the given board sizes
+def is_valid_grid(grid, sizes: tuple = BOARD_SIZES):
+    if not isinstance(grid, list) or len(grid) not in sizes:
+        return False
+    size = len(grid)
+    for row in grid:
+        if not isinstance(row, list) or len(row) != size:
+            return False
+        for elem in row:
+            if type(elem) is not int or not (elem == -1 or 1 <= elem <= size):
+                return False
+    return True
+
+# why validate_grid rejected a grid: it isn't a board at all (shape, range), its givens conflict (duplicate), or it's a
+# well-formed board that can't be completed (empty_domain, no_place, pigeonhole)
+INVALID_REASONS = ('shape', 'range', 'duplicate', 'empty_domain', 'no_place', 'pigeonhole')
+UNSOLVABLE_REASONS = ('empty_domain', 'no_place', 'pigeonhole')
+
+# raised by validate_grid, with the reason (one of INVALID_REASONS) and the (row, col) cells at fault
+class InvalidGrid(ValueError):
+    def __init__(self, reason: str, message: str, cells: list = ()):
+        super().__init__(message)
+        self.reason = reason
+        self.cells = list(cells)
+
+# name of a unit for error messages, e.g. "row 0" or "grid 4"
+def unit_name(layout: Layout, unit_index: int):
+    kind, index = divmod(unit_index, layout.size)
+    return ('row', 'column', 'grid')[kind] + ' ' + str(index)
+
+def format_cells(cells: list):
+    return ', '.join(f'({row}, {col})' for row, col in cells)
+
+# a group of masks that breaks the pigeonhole principle, i.e. more masks than bits between them, as indices into masks
+# only groups made of a mask and every mask it contains are tried, which finds e.g. three cells that share two candidates
+# in a handful of comparisons; returns None if there is none
+def crowded_group(masks: list, bit_count):
+    for mask in masks:
+        group = [index for index, other in enumerate(masks) if not other & ~mask]
+        if len(group) > bit_count[mask]:
+            return group
+    return None
+
+# fast checks in front of the solver, raising InvalidGrid with the cells at fault for a grid that can't be solved as given:
+#   shape:        not a square list of lists of a supported size (see BOARD_SIZES)
+#   range:        a cell that isn't an int in -1, 1-size
+#   duplicate:    a value given twice in a row, column, or grid
+#   empty_domain: an empty cell that no value fits in
+#   no_place:     a value missing from a row, column, or grid that none of its empty cells can take
+#   pigeonhole:   k empty cells of a unit with fewer than k candidates between them, or k missing values with fewer than k
+#                 cells to go in
+# each check is a pass over the cells or units (microseconds on a 9 x 9 board) and never searches. returns the grid's search state
+def validate_grid(grid):
+    if not isinstance(grid, list) or len(grid) not in BOARD_SIZES:
+        raise InvalidGrid('shape', 'expected a ' + ', '.join(f'{size} x {size}' for size in BOARD_SIZES) + ' grid')
+    size = len(grid)
+    for row_index, row in enumerate(grid):
+        if not isinstance(row, list) or len(row) != size:
+            raise InvalidGrid('shape', f'row {row_index} is not a list of {size} cells')
+        for col_index, elem in enumerate(row):
+            if type(elem) is not int or not (elem == -1 or 1 <= elem <= size):
+                raise InvalidGrid('range', f'cell ({row_index}, {col_index}) is {elem!r}, expected -1 or 1-{size}', [(row_index, col_index)])
+
+    # the first cell each value was given in, per unit
+    layout = get_layout(size)
+    seen = {}
+    for cell in range(layout.num_cells):
+        row_index, col_index = divmod(cell, size)
+        value = grid[row_index][col_index]
+        if value == -1:
+            continue
+        for unit_index in (layout.cell_row[cell], size + layout.cell_col[cell], 2 * size + layout.cell_grid[cell]):
+            first = seen.setdefault((unit_index, value), cell)
+            if first != cell:
+                cells = [divmod(first, size), (row_index, col_index)]
+                raise InvalidGrid('duplicate', f'{value} is given twice in {unit_name(layout, unit_index)}: {format_cells(cells)}', cells)
+
+    state = build_state(grid, {})
+    for cell in state.empties:
+        if not state.cands[cell]:
+            cells = [divmod(cell, size)]
+            raise InvalidGrid('empty_domain', f'no value fits in cell {format_cells(cells)}', cells)
+
+    for unit_index, unit in enumerate(layout.units):
+        empty = [cell for cell in unit if state.cells[cell] == -1]
+        if not empty:
+            continue
+        name = unit_name(layout, unit_index)
+
+        # the empty cells (as bits, by position in empty) each missing value could go in
+        missing = layout.mask_values[layout.all_values & ~unit_mask(state, unit_index)]
+        places = []
+        for value in missing:
+            bit = 1 << (value - 1)
+            place = 0
+            for position, cell in enumerate(empty):
+                if state.cands[cell] & bit:
+                    place |= 1 << position
+            if not place:
+                cells = [divmod(cell, size) for cell in empty]
+                raise InvalidGrid('no_place', f'{value} has no place left in {name}, none of {format_cells(cells)} can take it', cells)
+            places.append(place)
+
+        group = crowded_group([state.cands[cell] for cell in empty], layout.bit_count)
+        if group is not None:
+            cells = [divmod(empty[position], size) for position in group]
+            union = 0
+            for position in group:
+                union |= state.cands[empty[position]]
+            values = ', '.join(map(str, layout.mask_values[union]))
+            raise InvalidGrid('pigeonhole', f'cells {format_cells(cells)} of {name} only have the values {values} between them', cells)
+
+        group = crowded_group(places, BitCounts())
+        if group is not None:
+            union = 0
+            for position in group:
+                union |= places[position]
+            cells = [divmod(cell, size) for position, cell in enumerate(empty) if union & (1 << position)]
+            values = ', '.join(str(missing[position]) for position in group)
+            raise InvalidGrid('pigeonhole', f'values {values} can only go in cells {format_cells(cells)} of {name}', cells)
+    return state
+
+# the solve_grid result of a grid that validate_grid rejects ("invalid" for a malformed board or conflicting givens, "none"
+# for one that can't be completed), or None if the grid has to be searched
+def screen_grid(grid):
+    try:
+        validate_grid(grid)
+    except InvalidGrid as e:
+        return {"status": "none" if e.reason in UNSOLVABLE_REASONS else "invalid", "solution": None}
+    return None
+
+# solve one grid of a batch and return {"status": ..., "solution": ...}, where solution is None unless status is unique or multiple
+# time_limit and max_nodes bound the search (see SearchBudget), which reports status aborted once it runs out
+# note: module-level so it can be pickled and run in a worker process
+def solve_grid(grid, engine: str = 'csp', time_limit: float = None, max_nodes: int = None):
+    screened = screen_grid(grid)
+    if screened is not None:
+        return screened
+
+    to_assign = {(r, c): [] for r in range(len(grid)) for c in range(len(grid)) if grid[r][c] == -1}
+    try:
+        solution, is_unique = solve(grid, to_assign, engine=engine, budget=SearchBudget(time_limit, max_nodes))
+    except SearchAborted:
+        return {"status": "aborted", "solution": None}
+    if solution is None:
+        return {"status": "none", "solution": None}
+    return {"status": "unique" if is_unique else "multiple", "solution": solution}
+
+# solve many grids across a process pool, yielding each grid's result (see solve_grid) in input order as it becomes available
+# executor can be a long-lived ProcessPoolExecutor to reuse; otherwise one sized to the number of cores is created for this call
+# time_limit and max_nodes bound the search of each grid on its own, so one pathological grid can't hold a worker indefinitely
+def solve_batch(grids, engine: str = 'csp', executor: ProcessPoolExecutor = None, chunksize: int = 16, time_limit: float = None, max_nodes: int = None):
+    if engine not in ENGINES:
+        raise ValueError(f"unknown solver engine '{engine}', expected one of {ENGINES}")
+
+    # grids that fail validation are answered right here, so only the rest take up worker time
+    screened = [screen_grid(grid) for grid in grids]
+    pending = [grid for grid, result in zip(grids, screened) if result is None]
+
+    limits = (itertools.repeat(engine), itertools.repeat(time_limit), itertools.repeat(max_nodes))
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            solved = executor.map(solve_grid, pending, *limits, chunksize=chunksize)
+            yield from (next(solved) if result is None else result for result in screened)
+    else:
+        solved = executor.map(solve_grid, pending, *limits, chunksize=chunksize)
+        yield from (next(solved) if result is None else result for result in screened)
+
+# canonical form of a grid under the sudoku symmetry group: transposition, band and stack swaps, row swaps within a band,
+# column swaps within a stack, and digit relabeling. isomorphic grids share a canonical form, so a solution found for the
+# canonical grid can be mapped back to any of them.
+#
+# rows (and columns, bands, stacks) are first sorted by signatures that don't change under the group: how many givens they
+# hold, how often each given's digit appears in the grid, and how those spread over the crossing stacks and columns.
+# only rows with equal signatures can end up in different places, so the tied orders are enumerated and the candidate
+# that reads smallest (row by row, empty cells as 0, digits relabeled 1-9 by first appearance) is the canonical form.
+
+# cap on the candidate orderings tried per orientation; past it (e.g. almost-full grids, where every row looks alike) the
+# form is still a valid transform of the grid but isomorphs may no longer agree on it
+MAX_CANONICAL_CANDIDATES = 2048
+
+# label-independent value of each cell: 0 if empty, otherwise how many times its digit is given
+def cell_signatures(grid: list):
+    counts = [0] * 10
+    for row in grid:
+        for elem in row:
+            if elem != -1:
+                counts[elem] += 1
+    return [[0 if elem == -1 else counts[elem] for elem in row] for row in grid]
+
+# signature of each row (column when by_col), refined twice with the signatures of the crossing columns (rows)
+def line_signatures(signatures: list):
+    rows = [tuple(sorted(tuple(sorted(signatures[r][c] for c in range(stack * 3, stack * 3 + 3))) for stack in range(3))) for r in range(9)]
+    cols = [tuple(sorted(tuple(sorted(signatures[r][c] for r in range(band * 3, band * 3 + 3))) for band in range(3))) for c in range(9)]
+    for _ in range(2):
+        rows, cols = (
+            [(rows[r], tuple(sorted(tuple(sorted((signatures[r][c], cols[c]) for c in range(stack * 3, stack * 3 + 3))) for stack in range(3)))) for r in range(9)],
+            [(cols[c], tuple(sorted(tuple(sorted((signatures[r][c], rows[r]) for r in range(band * 3, band * 3 + 3))) for band in range(3)))) for c in range(9)],
+        )
+    return rows, cols
+
+# every order of items that sorts them by key, permuting only items with equal keys
+def tied_orders(items: list, key):
+    groups = [list(group) for _, group in itertools.groupby(sorted(items, key=key), key=key)]
+    for choice in itertools.product(*(itertools.permutations(group) for group in groups)):
+        yield [item for group in choice for item in group]
+
+# every order of the 9 lines (rows or columns) that sorts the blocks (bands or stacks) and the lines within each block
+def line_orders(signatures: list):
+    blocks = [range(block * 3, block * 3 + 3) for block in range(3)]
+    block_signature = lambda block: tuple(sorted(signatures[line] for line in blocks[block]))
+    line_signature = lambda line: signatures[line]
+    for block_order in tied_orders(list(range(3)), block_signature):
+        for choice in itertools.product(*(tied_orders(list(blocks[block]), line_signature) for block in block_order)):
+            yield [line for lines in choice for line in lines]
+
+# transposed copy of a grid
+def transpose(grid: list):
+    return [list(col) for col in zip(*grid)]
+
+# read the grid in the given row and column order, relabeling digits by first appearance
+# returns the cells as a flat tuple (0 for empty) and the relabeling as a list from original digit to new digit
+def relabeled(grid: list, row_order: list, col_order: list):
+    relabel = [0] * 10
+    next_label = 1
+    cells = []
+    for r in row_order:
+        row = grid[r]
+        for c in col_order:
+            elem = row[c]
+            if elem == -1:
+                cells.append(0)
+                continue
+            if relabel[elem] == 0:
+                relabel[elem] = next_label
+                next_label += 1
+            cells.append(relabel[elem])
+    # digits that aren't given take the remaining labels in order, so the relabeling is a permutation
+    for value in range(1, 10):
+        if relabel[value] == 0:
+            relabel[value] = next_label
+            next_label += 1
+    return tuple(cells), relabel
+
+# canonical form of a 9 x 9 grid (-1 for empty cells), returns (canonical grid, transform)
+# the transform is (transposed, row order, column order, relabeling) and maps the grid to its canonical form, see apply_transform
+# other board sizes aren't canonicalized (their tied orders grow too fast) and come back as they are, with the identity transform
+def canonical_form(grid: list):
+    if len(grid) != 9:
+        size = len(grid)
+        return [row[:] for row in grid], (False, list(range(size)), list(range(size)), list(range(size + 1)))
+
+    best = None
+    for transposed in (False, True):
+        oriented = transpose(grid) if transposed else grid
+        row_signatures, col_signatures = line_signatures(cell_signatures(oriented))
+        col_orders = list(itertools.islice(line_orders(col_signatures), MAX_CANONICAL_CANDIDATES))
+        tried = 0
+        for row_order in line_orders(row_signatures):
+            for col_order in col_orders:
+                cells, relabel = relabeled(oriented, row_order, col_order)
+                if best is None or cells < best[0]:
+                    best = (cells, (transposed, row_order, col_order, relabel))
+                tried += 1
+            if tried >= MAX_CANONICAL_CANDIDATES:
+                break
+
+    cells, transform = best
+    return [[cells[r * 9 + c] or -1 for c in range(9)] for r in range(9)], transform
+
+# map a grid through a transform from canonical_form, e.g. another solution of the same original grid
+def apply_transform(grid: list, transform: tuple):
+    transposed, row_order, col_order, relabel = transform
+    oriented = transpose(grid) if transposed else grid
+    return [[-1 if oriented[r][c] == -1 else relabel[oriented[r][c]] for c in col_order] for r in row_order]
+
+# map a grid in canonical coordinates (e.g. the solution of a canonical grid) back through the inverse of a transform
+def invert_transform(grid: list, transform: tuple):
+    transposed, row_order, col_order, relabel = transform
+    size = len(row_order)
+    original_value = [0] * (size + 1)
+    for value in range(1, size + 1):
+        original_value[relabel[value]] = value
+
+    oriented = [[-1] * size for _ in range(size)]
+    for i, r in enumerate(row_order):
+        for j, c in enumerate(col_order):
+            elem = grid[i][j]
+            oriented[r][c] = -1 if elem == -1 else original_value[elem]
+    return transpose(oriented) if transposed else oriented
@@ -1,5 +1,5 @@
 import React from 'react'
-import { useState, useEffect} from 'react'
+import { useState, useEffect, useRef} from 'react'
 import 'bootstrap/dist/css/bootstrap.min.css';
 import './App.css'
 import CSVModal from "./components/CSVModal"
@@ -84,6 +84,9 @@ function App() {
     // store the most recent element that hint revealed, used for temporary green highlight
     const [hintElem, setHintElem] = useState(null);
 
+    // store the hint session token, lets the server reuse its work from the previous hint
+    const hintToken = useRef(null);
+
     // store the current error
     const [error, setError] = useState(""); 
 
@@ -220,7 +223,8 @@ function App() {
             setIsFull(true);
             setError(result.is_unique ? "" : "Warning: This puzzle has more than 1 solution");
         } else {
-            setError(noSolutionError);
+            // the server names the conflicting cells when it rejects the grid outright
+            setError(result?.error ?? noSolutionError);
         }
     };
 
@@ -268,39 +272,39 @@ function App() {
 
     // function to reveal a single element at a time
     const handleHint = async () => {
-        // get the result
-        const result = await getResult();
-
-        // if there was a server error, it's passed as null - return
-        if (result == null) {
+        // ask the server for the next cell that can be deduced
+        let result;
+        try {
+            const response = await fetch('http://localhost:5000/hint', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ grid, token: hintToken.current }),
+            });
+            result = await response.json();
+        } catch (err) {
+            setError(serverError);
             return;
-        } 
+        }
 
-        // case: a solution exists
-        if (result?.solution) {
-            if (!result.is_unique) {
-                setError("Warning: This puzzle has more than 1 solution.");
-            } else {
-                // clear any previous error
-                setError("");
-            }
+        // keep the session token for the next hint
+        hintToken.current = result?.token ?? null;
+
+        // case: a hint was found
+        if (result?.hint) {
+            // clear any previous error
+            setError("");
 
             // copy the current grid into newGrid
             const newGrid = [...grid.map((row) => [...row])];
-            // make unfilledPositions into an array and select a random element from it
-            const position_array = Array.from(unfilledPositions);
-            const randomIndex = Math.floor(Math.random() * position_array.length);
-            const randomElem = position_array[randomIndex];
-
-            // convert the row-col key to numerical indices
-            const grid_indices = randomElem.split("-");
-            const rowIndex = parseInt(grid_indices[0]);
-            const colIndex = parseInt(grid_indices[1]);
+            const { row: rowIndex, col: colIndex, value } = result.hint;
 
             // update grid and state of system
-            newGrid[rowIndex][colIndex] = result.solution[rowIndex][colIndex];
+            newGrid[rowIndex][colIndex] = value;
             setGrid(newGrid);
             updateUnfilledPositions(newGrid);
+            setIsFull(checkIfFull(newGrid));
 
             // highlight that cell for 2 seconds
             setHintElem([rowIndex, colIndex]);
@@ -308,11 +312,9 @@ function App() {
                 setHintElem(null);
             }, 1500);
 
-
         } else {
-            // case: no solution
-            setError(noSolutionError);
-            setError("");
+            // case: no solution, or the grid was rejected outright
+            setError(result?.error ?? noSolutionError);
         }
     }
 